@@ -1,16 +1,17 @@
 import cv2 as cv
 import numpy as np
 from utils import draw_text_with_bg
+from video_io import create_video_writer, open_video_source
 from Pose_estimationModule import PoseDetector
 
 # Initializing pose detector and video capture
 detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/running.mp4")
+cap = open_video_source("VIDEOS/INPUTS/running.mp4")
 
 # Getting video properties (width, height, FPS) and setting up the output file for saving
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/tracking_steps.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h))
 
 if not cap.isOpened():
     print("Error: couldn't open the video!")
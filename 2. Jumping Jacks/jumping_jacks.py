@@ -1,14 +1,15 @@
 import cv2 as cv
-import numpy as np
 from utils import draw_text_with_bg
+from video_io import create_video_writer, open_video_source
+from angles import calculate_angles
 from Pose_estimationModule import PoseDetector
 
 # Initializing the pose detector
 detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/jumping_jacks.mp4")
+cap = open_video_source("VIDEOS/INPUTS/jumping_jacks.mp4")
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/jumping_jacks_count.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h))
 
 if not cap.isOpened():
     print("Error: couldn't open the video!")
@@ -18,32 +19,6 @@ count = 0
 stage = None  # 'up' or 'down'
 color = (0, 0, 255)  # Red for down, green for up
 
-# Function to calculate the angle formed by three points
-def calculate_angle(a, b, c):
-    """
-    Calculating the angle formed by three points.
-
-    Args:
-        a: First point (e.g., shoulder) [x, y].
-        b: Middle point (e.g., elbow) [x, y].
-        c: Third point (e.g., wrist) [x, y].
-
-    Returns:
-        angle: Angle in degrees between the vectors ab and bc.
-    """
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-
-    ab = a - b  # Vector from shoulder to elbow
-    bc = c - b  # Vector from elbow to wrist
-
-    cosine_angle = np.dot(ab, bc) / (np.linalg.norm(ab) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)  # Clipping to avoid domain error in arccos
-    angle = np.degrees(np.arccos(cosine_angle))
-
-    return angle
-
 # Function for counting and setting color based on angle
 def update_count_and_color_by_angle(angle, stage, count):
     """
@@ -92,8 +67,8 @@ while cap.isOpened():
     right_elbow = landmarks[14]
 
     # Calculating the angle for both arms
-    angle_left = calculate_angle(left_hip, left_shoulder, left_elbow)
-    angle_right = calculate_angle(right_hip, right_shoulder, right_elbow)
+    angle_left, angle_right = calculate_angles([left_hip, right_hip], [left_shoulder, right_shoulder],
+                                               [left_elbow, right_elbow])
     
     # Updating right hand count and color based on angle
     stage, count, color = update_count_and_color_by_angle(angle_left, stage, count)
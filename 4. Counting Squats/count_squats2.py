@@ -1,16 +1,18 @@
 import cv2 as cv
-import numpy as np
 from utils import draw_text_with_bg
+from video_io import create_video_writer, open_video_source
+from angles import calculate_angles
 from Pose_estimationModule import PoseDetector
+from pipeline import PosePipeline
 
 # Initializing pose detector and video capture
 detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/squats.mp4")
+cap = open_video_source("VIDEOS/INPUTS/squats.mp4")
 
 # Getting video properties (width, height, FPS) and setting up the output file for saving
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/count_squats.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h))
 
 if not cap.isOpened():
     print("Error: couldn't open the video!")
@@ -21,24 +23,6 @@ stage = None  # 'up' or 'down'
 color = (0, 0, 255)  # Defaulting to red color for the 'down' stage
 
 
-# Defining a function for calculating the angle formed by three points (e.g., shoulder, elbow, wrist)
-def calculate_angle(a, b, c):
-    """
-    Calculating the angle formed by three points.
-    Args:
-        a: First point (e.g., shoulder) [x, y].
-        b: Middle point (e.g., elbow) [x, y].
-        c: Third point (e.g., wrist) [x, y].
-    Returns:
-        angle: Angle in degrees between the vectors ab and bc.
-    """
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    ab, bc = a - b, c - b  # Creating vectors from point b to a, and point b to c
-    cosine_angle = np.dot(ab, bc) / (np.linalg.norm(ab) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)  # Clipping to prevent domain error in arccos
-    return np.degrees(np.arccos(cosine_angle))
-
-
 # Defining a function for updating the count and stage based on joint angle (e.g., knee angle)
 def update_count_and_color_by_angle(angle, stage, count):
     """
@@ -65,26 +49,28 @@ def update_count_and_color_by_angle(angle, stage, count):
     return stage, count, color
 
 
-# Main loop for processing the video frames
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    # Detecting pose and extracting landmarks
-    frame = detector.find_pose(frame, draw=False)
-    landmarks = detector.get_positions(frame)
+# Counting stage: computing the angles and updating the squat count for each frame, in frame order
+def count_squats(index, landmarks):
+    global stage, count
 
     # Extracting right-side landmarks for shoulder, hip, knee, and ankle
     right_shoulder, right_hip = landmarks[12], landmarks[24]
     right_knee, right_ankle = landmarks[26], landmarks[28]
 
     # Calculating the knee and hip angles
-    angle_knee = calculate_angle(right_hip, right_knee, right_ankle)
-    angle_hip = calculate_angle(right_shoulder, right_hip, right_knee)
+    angle_knee, angle_hip = calculate_angles([right_hip, right_shoulder], [right_knee, right_hip],
+                                             [right_ankle, right_knee])
 
     # Updating squat count and color based on knee angle
     stage, count, color = update_count_and_color_by_angle(angle_knee, stage, count)
+    return count, color, angle_knee, angle_hip
+
+
+# Rendering stage: drawing the count, joints and angles onto the frame
+def draw_squats(frame, landmarks, result):
+    count, color, angle_knee, angle_hip = result
+    right_shoulder, right_hip = landmarks[12], landmarks[24]
+    right_knee, right_ankle = landmarks[26], landmarks[28]
 
     # Displaying squat count and angles on the frame
     draw_text_with_bg(frame, f"Count: {count}", (0, 50), font_scale=1.5, thickness=2, bg_color=color)
@@ -99,9 +85,10 @@ while cap.isOpened():
     draw_text_with_bg(frame, f"{int(angle_hip)} degrees", (right_hip[0] - 100, right_hip[1]), font_scale=0.8,
                       thickness=2)
 
-    # Saving the processed frame to the output video
-    out.write(frame)
 
+# Main loop: decoding, pose detection, counting, drawing and saving run on separate threads
+pipeline = PosePipeline(detector, count_fn=count_squats, render_fn=draw_squats, writer=out)
+for index, frame, landmarks, result in pipeline.run(cap):
     # Resizing frame for displaying
     resizing_factor = 0.45
     resized_shape = (int(resizing_factor * frame.shape[1]), int(resizing_factor * frame.shape[0]))
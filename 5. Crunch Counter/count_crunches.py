@@ -1,14 +1,15 @@
 import cv2 as cv
-import numpy as np
 from utils import draw_text_with_bg
+from video_io import create_video_writer, open_video_source
+from angles import calculate_angle
 from Pose_estimationModule import PoseDetector
 
 # Initializing pose detector and capturing video
 detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/crunches.mp4")
+cap = open_video_source("VIDEOS/INPUTS/crunches.mp4")
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/crunches_counter.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h))
 
 if not cap.isOpened():
     print("Error: couldn't open the video!")
@@ -17,14 +18,6 @@ if not cap.isOpened():
 count_left, stage_left = 0, None  # Tracking count and stage ('up' or 'down')
 color = (0, 0, 255)  # Setting initial color to red for 'down' position
 
-# Defining function for calculating the angle formed by three points (e.g., shoulder, elbow, wrist)
-def calculate_angle(a, b, c):
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    ab, bc = a - b, c - b
-    cosine_angle = np.dot(ab, bc) / (np.linalg.norm(ab) * np.linalg.norm(bc))
-    angle = np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))  # Clipping to avoid domain errors
-    return angle
-
 # Defining function for updating count and color based on angle and stage
 def update_count_and_color_by_angle(angle, stage, count):
     if angle > 60:  # Checking for 'down' position
@@ -1,17 +1,18 @@
 import cv2 as cv
-import numpy as np
 from utils import draw_text_with_bg
+from video_io import open_video_source
+from angles import calculate_angles
 from Pose_estimationModule import PoseDetector
 
 # Initializing pose detector
 detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/dumbbell_curl.mp4")
+cap = open_video_source("VIDEOS/INPUTS/dumbbell_curl.mp4")
 
 # Retrieving video dimensions and frame rate
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/curl_angle_counter1.mp4"
 # Initializing video writer for saving the output video
-# out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+# out = create_video_writer(filename, fps, (w, h))
 
 if not cap.isOpened():
     print("Error: couldn't open the video!")
@@ -21,33 +22,6 @@ count_right, count_left = 0, 0
 stage_right, stage_left = None, None  # Defining 'up' or 'down' stage
 color_left, color_right = (0, 0, 255), (0, 0, 255)  # Initializing red color for 'down' position, green for 'up'
 
-# Defining function to calculate the angle formed by three points
-def calculate_angle(a, b, c):
-    """
-    Calculating the angle formed by three points.
-
-    Args:
-        a: First point (e.g., shoulder) [x, y].
-        b: Middle point (e.g., elbow) [x, y].
-        c: Third point (e.g., wrist) [x, y].
-
-    Returns:
-        angle: Angle in degrees between the vectors ab and bc.
-    """
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-
-    ab = a - b  # Defining vector from shoulder to elbow
-    bc = c - b  # Defining vector from elbow to wrist
-
-    # Calculating cosine of the angle between the two vectors
-    cosine_angle = np.dot(ab, bc) / (np.linalg.norm(ab) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)  # Clipping to avoid domain error in arccos
-    angle = np.degrees(np.arccos(cosine_angle))  # Converting the angle to degrees
-
-    return angle
-
 # Predefining function for counting repetitions and setting color based on angle
 def update_count_and_color_by_angle(angle, stage, count):
     """
@@ -92,8 +66,8 @@ while cap.isOpened():
     left_wrist, right_wrist = landmarks[15], landmarks[16]
 
     # Calculating the angle for both arms
-    angle_right = calculate_angle(right_shoulder, right_elbow, right_wrist)
-    angle_left = calculate_angle(left_shoulder, left_elbow, left_wrist)
+    angle_right, angle_left = calculate_angles([right_shoulder, left_shoulder], [right_elbow, left_elbow],
+                                               [right_wrist, left_wrist])
 
     # Updating right hand count and color based on the calculated angle
     stage_right, count_right, color_right = update_count_and_color_by_angle(angle_right, stage_right, count_right)
@@ -1,14 +1,15 @@
 import mediapipe as mp
 import cv2 as cv
 from utils import draw_text_with_bg
+from video_io import create_video_writer, open_video_source
 from Pose_estimationModule import PoseDetector
 
 # Initializing the pose detector and video capture
 detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/dumbbell_curl_single_hand.mp4")
+cap = open_video_source("VIDEOS/INPUTS/dumbbell_curl_single_hand.mp4")
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/dumbbell_curl_counter.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h))
 
 # Checking if video is opened successfully
 if not cap.isOpened():
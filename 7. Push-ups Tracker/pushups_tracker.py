@@ -1,14 +1,15 @@
 import cv2 as cv
-import numpy as np
 from utils import draw_text_with_bg
+from video_io import create_video_writer, open_video_source
+from angles import calculate_angle
 from Pose_estimationModule import PoseDetector
 
 # Initialize pose detector
 detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/pushups.mp4")
+cap = open_video_source("VIDEOS/INPUTS/pushups.mp4")
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/push-ups_counter.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h))
 
 if not cap.isOpened():
     print("Error: couldn't open the video!")
@@ -22,33 +23,6 @@ jump_stage = None
 jump_color = (0, 0, 255)
 
 
-# Function to calculate the angle formed by three points
-def calculate_angle(a, b, c):
-    """
-    Calculate the angle formed by three points.
-
-    Args:
-        a: First point (e.g., shoulder) [x, y].
-        b: Middle point (e.g., elbow) [x, y].
-        c: Third point (e.g., wrist) [x, y].
-
-    Returns:
-        angle: Angle in degrees between the vectors ab and bc.
-    """
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-
-    ab = a - b  # Vector from shoulder to elbow
-    bc = c - b  # Vector from elbow to wrist
-
-    cosine_angle = np.dot(ab, bc) / (np.linalg.norm(ab) * np.linalg.norm(bc))
-    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)  # Clip to avoid domain error in arccos
-    angle = np.degrees(np.arccos(cosine_angle))
-
-    return angle
-
-
 # Predefined function for counting and setting color based on angle
 def update_count_and_color_by_angle(angle, stage, count):
     """
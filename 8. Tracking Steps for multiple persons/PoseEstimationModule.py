@@ -1,10 +1,18 @@
 import cv2 as cv
-import mediapipe as mp
+import numpy as np
 import os
+from landmark_cache import ArrayPoseResults, LandmarkCache
+from metrics import metrics, timed
+from utils import SkeletonRenderer
+from video_io import create_video_writer, open_video_source
+
+NUM_LANDMARKS = 33
 
 
 class PoseDetector:
-    def __init__(self, mode=False, complexity=1, smooth=True, detection_con=0.5, track_con=0.5):
+    def __init__(self, mode=False, complexity=1, smooth=True, detection_con=0.5, track_con=0.5, cache_dir=None,
+                 keyframe_interval=1, flow_min_tracked=0.8, keyframe_min_visibility=0.5, auto_roi=False,
+                 roi_padding=0.25, inference_scale=1.0, max_side=None):
         self.results = None
         self.mode = mode
         self.complexity = complexity
@@ -12,6 +20,9 @@ class PoseDetector:
         self.detection_con = detection_con
         self.track_con = track_con
 
+        # Importing MediaPipe (and its TensorFlow Lite runtime) only when a detector is built, so modules that
+        # merely import PoseDetector start fast
+        import mediapipe as mp
         self.mpPose = mp.solutions.pose
         # Correctly initialize Pose with appropriate arguments
         self.pose = self.mpPose.Pose(
@@ -21,36 +32,332 @@ class PoseDetector:
             min_detection_confidence=self.detection_con,
             min_tracking_confidence=self.track_con
         )
-        self.mpDraw = mp.solutions.drawing_utils
+        self.renderer = SkeletonRenderer(self.mpPose.POSE_CONNECTIONS)
+
+        # Preallocated landmark buffers, keyed by the selected landmark IDs (None means all 33)
+        self._landmark_buffers = {None: np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)}
+
+        # Optional on-disk landmark cache, see open_cache()
+        self.cache_dir = cache_dir
+        self.cache = None
+        self.frame_index = 0
+
+        # Keyframe mode: MediaPipe runs every keyframe_interval frames, optical flow moves the landmarks in between
+        self.keyframe_interval = keyframe_interval
+        self.flow_min_tracked = flow_min_tracked  # Minimum fraction of landmarks the flow must keep tracking
+        self.keyframe_min_visibility = keyframe_min_visibility  # Minimum mean visibility to propagate a keyframe
+        self._prev_gray = None
+        self._flow_landmarks = None  # Normalized (33, 4) landmarks being propagated
+        self._flow_points = None  # Their pixel positions, shaped (33, 1, 2) for calcOpticalFlowPyrLK
+        self._since_keyframe = 0
+
+        # Auto-ROI: running inference on a padded crop around the previous pose instead of the full frame
+        self.auto_roi = auto_roi
+        self.roi_padding = roi_padding  # Padding around the pose, as a fraction of its longest side
+        self._roi = None  # (x1, y1, x2, y2) in pixels, None to use the full frame
+        self._roi_frame_shape = None
+
+        # Inference resolution: frames are downscaled before MediaPipe, landmarks stay in original-frame pixels
+        self.inference_scale = inference_scale
+        self.max_side = max_side  # Optional cap on the longest side of the image given to MediaPipe
+        self._inference_sizes = {}  # Frame shape -> (width, height) for MediaPipe, or None for no resizing
 
-    def find_pose(self, frame, draw=True):
-        # Convert frame to RGB for MediaPipe processing
-        frame_rgb = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+        # Preallocated preprocessing buffers, reallocated only when the frame shape changes
+        self._buffers = {}
+        self.allocations = 0  # Number of preprocessing buffers allocated so far
+        self.preprocessed_frames = 0
 
+    def cache_settings(self):
+        # Detector settings that change the landmarks, all of them go into the cache key
+        return {"mode": self.mode, "complexity": self.complexity, "smooth": self.smooth,
+                "detection_con": self.detection_con, "track_con": self.track_con,
+                "keyframe_interval": self.keyframe_interval, "flow_min_tracked": self.flow_min_tracked,
+                "keyframe_min_visibility": self.keyframe_min_visibility, "auto_roi": self.auto_roi,
+                "roi_padding": self.roi_padding, "inference_scale": self.inference_scale, "max_side": self.max_side}
+
+    def open_cache(self, video_path, frame_count=None):
+        """
+        Starts using the landmark cache in cache_dir for a video that is processed from its first frame.
+
+        On a hit, find_pose reads each frame's landmarks from the cache and skips MediaPipe entirely. On a miss,
+        the landmarks are recorded and saved by close_cache(complete=True) once the video was read to its end
+        (and at least frame_count frames went through).
+
+        Returns:
+            True if the landmarks of this video and these settings were already cached.
+        """
+        if self.cache_dir is None:
+            raise ValueError("PoseDetector was created without a cache_dir")
+        self.close_cache()
+        self.cache = LandmarkCache(self.cache_dir, video_path, self.cache_settings(), frame_count)
+        self.frame_index = 0
+        return self.cache.readonly
+
+    def close_cache(self, complete=False):
+        # Only a video read to its end is saved; closing in the middle (e.g. reset()) discards the recording
+        if self.cache is not None:
+            self.cache.close(complete)
+            self.cache = None
+
+    def reset(self):
+        """ Forgets the current video (tracking, smoothing, optical flow and ROI) so the warm model can be reused. """
+        self.close_cache()
+        self.pose.reset()
+        self.results = None
+        self.frame_index = 0
+        self._prev_gray = self._flow_landmarks = self._flow_points = None
+        self._since_keyframe = 0
+        self._roi = self._roi_frame_shape = None
+
+    def close(self):
+        # Releasing the MediaPipe graph and finishing any open cache
+        self.close_cache()
+        self.pose.close()
+
+    @staticmethod
+    def _normalized_landmarks(results):
+        # Normalized (33, 4) landmarks of a results object, or None without a pose
+        if isinstance(results, ArrayPoseResults):
+            return results.landmark_array
+        if not results.pose_landmarks:
+            return None
+        return np.array([(landmark.x, landmark.y, landmark.z, landmark.visibility)
+                         for landmark in results.pose_landmarks.landmark], dtype=np.float32)
+
+    def _inference_size(self, frame):
+        # Size of the image given to MediaPipe for frames of this shape, None to keep the frame as it is
+        h, w = frame.shape[:2]
+        if (h, w) not in self._inference_sizes:
+            scale = self.inference_scale
+            if self.max_side is not None:
+                scale = min(scale, self.max_side / max(h, w))
+            self._inference_sizes[(h, w)] = (max(1, round(w * scale)), max(1, round(h * scale))) if scale < 1 else None
+        return self._inference_sizes[(h, w)]
+
+    def _buffer(self, name, shape):
+        # Reusing the named buffer while the shape stays the same
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, dtype=np.uint8)
+            self.allocations += 1
+        return buffer
+
+    @property
+    def allocations_per_frame(self):
+        # Average number of preprocessing allocations per frame, 0 once the buffers are warm
+        return self.allocations / max(self.preprocessed_frames, 1)
+
+    @timed("preprocess")
+    def _preprocess(self, frame):
+        """ Resizes and converts a BGR frame into the read-only RGB image given to MediaPipe. """
+        # Downscaling first so the colour conversion only touches the small image. MediaPipe's landmarks are
+        # normalized, so they map back onto the original frame without any extra remapping
+        size = self._inference_size(frame)
+        if size is not None:
+            frame = cv.resize(frame, size, dst=self._buffer("resized", (size[1], size[0], 3)),
+                              interpolation=cv.INTER_AREA)
+
+        # Convert frame to RGB for MediaPipe processing, into the reused RGB buffer
+        frame_rgb = self._buffer("rgb", frame.shape)
+        frame_rgb.flags.writeable = True
+        cv.cvtColor(frame, cv.COLOR_BGR2RGB, dst=frame_rgb)
+
+        # Marking the image read-only lets MediaPipe use it by reference instead of making a defensive copy
+        frame_rgb.flags.writeable = False
+        self.preprocessed_frames += 1
+        return frame_rgb
+
+    def _process(self, frame):
         # Process the frame to detect poses
-        self.results = self.pose.process(frame_rgb)
+        frame_rgb = self._preprocess(frame)
+        with metrics.timer("pose_process"):
+            return self.pose.process(frame_rgb)
+
+    def _update_roi(self, landmarks, w, h):
+        # Box around the landmarks MediaPipe is confident about, falling back to all of them
+        visible = landmarks[landmarks[:, 3] >= 0.5]
+        if len(visible) < 4:
+            visible = landmarks
+        xs, ys = np.clip(visible[:, 0] * w, 0, w), np.clip(visible[:, 1] * h, 0, h)
+        bx1, bx2, by1, by2 = xs.min(), xs.max(), ys.min(), ys.max()
+
+        # Keeping the current crop while the pose stays well inside it, so MediaPipe's tracking sees a stable view
+        if self._roi is not None:
+            x1, y1, x2, y2 = self._roi
+            mx, my = 0.1 * (x2 - x1), 0.1 * (y2 - y1)
+            if bx1 >= x1 + mx and bx2 <= x2 - mx and by1 >= y1 + my and by2 <= y2 - my:
+                return
 
-        # Draw the detected pose landmarks on the frame
-        if self.results.pose_landmarks:
-            if draw:
-                self.mpDraw.draw_landmarks(frame, self.results.pose_landmarks, self.mpPose.POSE_CONNECTIONS)
+        pad = self.roi_padding * max(bx2 - bx1, by2 - by1)
+        x1, y1 = int(max(0, bx1 - pad)), int(max(0, by1 - pad))
+        x2, y2 = int(min(w, bx2 + pad)), int(min(h, by2 + pad))
+
+        # Cropping only pays off when the box is clearly smaller than the frame
+        if x2 - x1 < 16 or y2 - y1 < 16 or (x2 - x1) * (y2 - y1) > 0.8 * w * h:
+            self._roi = None
+        else:
+            self._roi = (x1, y1, x2, y2)
+
+    def _detect(self, frame):
+        if not self.auto_roi:
+            return self._process(frame)
+
+        h, w = frame.shape[:2]
+        if self._roi_frame_shape != (h, w):
+            self._roi, self._roi_frame_shape = None, (h, w)
+
+        if self._roi is not None:
+            x1, y1, x2, y2 = self._roi
+            landmarks = self._normalized_landmarks(self._process(frame[y1:y2, x1:x2]))
+            if landmarks is not None:
+                # Mapping the crop's normalized coordinates back to the full frame
+                crop_w, crop_h = x2 - x1, y2 - y1
+                landmarks[:, 0] = (landmarks[:, 0] * crop_w + x1) / w
+                landmarks[:, 1] = (landmarks[:, 1] * crop_h + y1) / h
+                landmarks[:, 2] *= crop_w / w
+                self._update_roi(landmarks, w, h)
+                return ArrayPoseResults(landmarks)
+
+        # No crop yet, or the pose was lost inside it: running on the full frame
+        results = self._process(frame)
+        landmarks = self._normalized_landmarks(results)
+        self._roi = None
+        if landmarks is not None:
+            self._update_roi(landmarks, w, h)
+        return results
+
+    def _start_flow(self, results, frame_gray):
+        # Keeping a keyframe's landmarks for propagation, unless the pose is missing or too uncertain
+        landmarks = self._normalized_landmarks(results)
+        if landmarks is None or landmarks[:, 3].mean() < self.keyframe_min_visibility:
+            self._flow_landmarks = None
+            return
+        h, w = frame_gray.shape
+        self._flow_landmarks = landmarks.copy()
+        self._flow_points = (landmarks[:, :2] * (w, h)).astype(np.float32).reshape(-1, 1, 2)
+
+    def _propagate(self, frame_gray):
+        # Moving the last landmarks onto the current frame with sparse Lucas-Kanade optical flow
+        points, status, _ = cv.calcOpticalFlowPyrLK(self._prev_gray, frame_gray, self._flow_points, None,
+                                                    winSize=(21, 21), maxLevel=3)
+        tracked = status.ravel() == 1
+        if tracked.mean() < self.flow_min_tracked:
+            return None
+
+        h, w = frame_gray.shape
+        landmarks = self._flow_landmarks
+        landmarks[:, :2] = points.reshape(-1, 2) / (w, h)
+        landmarks[~tracked, 3] = 0  # Landmarks the flow lost are reported as not visible
+        self._flow_points = points
+        return ArrayPoseResults(landmarks.copy())
+
+    def _track_or_detect(self, frame):
+        frame_gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        results = None
+        if (self._flow_landmarks is not None and self._since_keyframe + 1 < self.keyframe_interval
+                and self._prev_gray.shape == frame_gray.shape):
+            results = self._propagate(frame_gray)
+
+        if results is None:
+            # Keyframe (or the flow lost track): running full inference and restarting the propagation
+            results = self._detect(frame)
+            self._since_keyframe = 0
+            self._start_flow(results, frame_gray)
+        else:
+            self._since_keyframe += 1
+        self._prev_gray = frame_gray
+        return results
+
+    @timed("find_pose")
+    def find_pose(self, frame, draw=True, color=None):
+        if self.cache is not None and self.cache.readonly and self.frame_index < len(self.cache):
+            # Reading this frame's landmarks from the cache instead of running MediaPipe
+            self.results = ArrayPoseResults(self.cache.read(self.frame_index))
+        else:
+            if self.keyframe_interval > 1:
+                self.results = self._track_or_detect(frame)
+            else:
+                self.results = self._detect(frame)
+
+            # Record the landmarks while filling the cache
+            if self.cache is not None and not self.cache.readonly:
+                self.cache.write(self._normalized_landmarks(self.results))
+        self.frame_index += 1
+
+        # Draw the detected pose landmarks on the frame, optionally in a per-track colour
+        if draw:
+            self.renderer.draw(frame, self.get_landmark_array(frame), color=color)
         return frame
 
+    def get_normalized_landmarks(self):
+        """
+        Returns the last frame's landmarks in MediaPipe's normalized coordinates, e.g. to send them to another
+        process that scales them to its own frame size.
+
+        Returns:
+            A float32 array of shape (33, 4) of (x, y, z, visibility), or None if no pose was detected.
+        """
+        if self.results is None:
+            return None
+        return self._normalized_landmarks(self.results)
+
+    def get_landmark_array(self, frame, ids=None):
+        """
+        Returns the detected landmarks as an array of (x, y, z, visibility) rows in pixel space.
+
+        Args:
+            frame: Frame the pose was detected on, used to scale the normalized coordinates.
+            ids: Optional sequence of landmark IDs (e.g. (11, 13, 15)); only those rows are filled, in that order.
+
+        Returns:
+            A float32 array of shape (33, 4), or (len(ids), 4) when ids is given, or None if no pose was detected.
+            The array is reused on the next call, so copy it if it has to outlive the current frame.
+        """
+        if isinstance(self.results, ArrayPoseResults):
+            cached = self.results.landmark_array
+            if cached is None:
+                return None
+        elif not self.results or not self.results.pose_landmarks:
+            return None
+        else:
+            cached = None
+
+        key = None if ids is None else tuple(ids)
+        buffer = self._landmark_buffers.get(key)
+        if buffer is None:
+            buffer = self._landmark_buffers[key] = np.zeros((len(key), 4), dtype=np.float32)
+
+        if cached is not None:
+            # Cached landmarks are already an array
+            buffer[:] = cached if key is None else cached[list(key)]
+        else:
+            # Copying only the requested landmarks out of the protobuf list
+            landmark_list = self.results.pose_landmarks.landmark
+            for row, ID in enumerate(range(NUM_LANDMARKS) if key is None else key):
+                landmark = landmark_list[ID]
+                buffer[row] = (landmark.x, landmark.y, landmark.z, landmark.visibility)
+
+        # Converting normalized coordinates to pixel coordinates (z uses the same scale as x)
+        h, w = frame.shape[:2]
+        buffer[:, 0] *= w
+        buffer[:, 1] *= h
+        buffer[:, 2] *= w
+        return buffer
+
     def get_positions(self, frame):
         # Extract pose landmark positions and store them in a dictionary
         landmarks = {}
-        if self.results.pose_landmarks:
-            for ID, landmark in enumerate(self.results.pose_landmarks.landmark):
-                # Convert normalized coordinates to pixel coordinates
-                h, w, c = frame.shape
-                cx, cy = int(landmark.x * w), int(landmark.y * h)
+        landmark_array = self.get_landmark_array(frame)
+        if landmark_array is not None:
+            # Truncating pixel coordinates to integers, as int() does
+            for ID, (cx, cy) in enumerate(landmark_array[:, :2].astype(np.int32).tolist()):
                 landmarks[ID] = (cx, cy)
         return landmarks
 
 
-def pose_estimator_in_video(video_path, filename, resizing_factor, save_video=False):
-    # Initialize video capture from file or webcam
-    cap = cv.VideoCapture(0 if video_path == 0 else video_path)
+def pose_estimator_in_video(video_path, filename, resizing_factor, save_video=False, max_side=None):
+    # Initialize video capture from file or webcam, optionally decoding straight to a smaller inference resolution
+    cap = open_video_source(0 if video_path == 0 else video_path, max_side=max_side, reuse_buffer=True)
     if not cap.isOpened():
         print("Couldn't capture the video file")
         return
@@ -73,8 +380,7 @@ def pose_estimator_in_video(video_path, filename, resizing_factor, save_video=Fa
     if save_video:
         video_dir = r"D:\PyCharm\PyCharm_files\MEDIAPIPE\POSE_ESTIMATION\VIDEOS"
         save_video_path = os.path.join(video_dir, filename)
-        fourcc = cv.VideoWriter_fourcc(*'mp4v')  # Define codec
-        out = cv.VideoWriter(save_video_path, fourcc, fps, (frame_width, frame_height))
+        out = create_video_writer(save_video_path, fps, (frame_width, frame_height))  # ffmpeg if available
 
     # Calculate resized frame dimensions
     resized_frame_size = (int(resizing_factor * frame_width), int(resizing_factor * frame_height))
@@ -107,6 +413,13 @@ def pose_estimator_in_video(video_path, filename, resizing_factor, save_video=Fa
         if cv.waitKey(1) & 0xff == ord('p'):  # Exit on pressing 'p'
             break
 
+    # Report how much of the run was spent decoding, and how many buffers were allocated per frame
+    if cap.frames_decoded:
+        print(f"Decoded {cap.frames_decoded} frames in {cap.decode_time:.2f}s "
+              f"({1000 * cap.decode_time / cap.frames_decoded:.1f} ms/frame)")
+        print(f"Allocations per frame: capture {cap.allocations / cap.frames_decoded:.2f}, "
+              f"preprocessing {detector.allocations_per_frame:.2f}")
+
     # Release resources
     cap.release()
     if save_video:
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+from PoseEstimationModule import PoseDetector
+
+
+class PoseDetectorPool:
+    """
+    Keeps one PoseDetector per YOLO track ID, so MediaPipe's tracking mode and landmark smoothing always follow
+    the same person instead of jumping between the crops of different people.
+
+    The number of live detectors is capped: the least recently used one is closed when a new track needs a slot,
+    and detectors whose track has not been seen for max_idle_frames frames are closed by evict_idle().
+    """
+
+    def __init__(self, max_detectors=8, max_idle_frames=60, **detector_kwargs):
+        """
+        Args:
+            max_detectors: Maximum number of live PoseDetector instances.
+            max_idle_frames: Number of frames a track may go unseen before its detector is closed.
+            detector_kwargs: Keyword arguments passed to every PoseDetector.
+        """
+        self.max_detectors = max_detectors
+        self.max_idle_frames = max_idle_frames
+        self.detector_kwargs = detector_kwargs
+        self.detectors = OrderedDict()  # track_id -> (detector, last frame index), least recently used first
+
+    def __len__(self):
+        return len(self.detectors)
+
+    def get(self, track_id, frame_index):
+        """ Returns the detector of a track, creating it (and evicting the least recently used one) if needed. """
+        if track_id in self.detectors:
+            detector, _ = self.detectors.pop(track_id)
+        else:
+            while len(self.detectors) >= self.max_detectors:
+                _, (evicted, _) = self.detectors.popitem(last=False)
+                evicted.close()
+            detector = PoseDetector(**self.detector_kwargs)
+        self.detectors[track_id] = (detector, frame_index)
+        return detector
+
+    def evict_idle(self, frame_index):
+        """ Closes the detectors of tracks that have not been seen for more than max_idle_frames frames. """
+        while self.detectors:
+            track_id, (detector, last_seen) = next(iter(self.detectors.items()))
+            if frame_index - last_seen <= self.max_idle_frames:
+                break
+            del self.detectors[track_id]
+            detector.close()
+
+    def close(self):
+        for detector, _ in self.detectors.values():
+            detector.close()
+        self.detectors.clear()
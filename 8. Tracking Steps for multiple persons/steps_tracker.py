@@ -1,51 +1,81 @@
+import argparse
 import cv2 as cv
-from ultralytics import YOLO
-from PoseEstimationModule import PoseDetector
-from utils import draw_text_with_bg
-
-# Initializing YOLO model for object detection
-model = YOLO(r"D:\PyCharm\PyCharm_files\OBJECT DETECTION\YOLO_WEIGHTS\yolov8n.pt")
-class_names = list(model.names.values())  # List of class names from the YOLO model
-
-# Initializing pose detector and video capture
-detector = PoseDetector()
-cap = cv.VideoCapture("VIDEOS/INPUTS/people_jogging.mp4")
+import numpy as np
+from detection_scheduler import DetectionScheduler, landmark_box
+from detector_pool import PoseDetectorPool
+from events import EventStream
+from models import load_yolo
+from track_table import TrackTable
+from utils import HUD
+from video_io import create_video_writer, open_video_source
+
+# Optional headless mode: a JSONL stream of step events instead of drawing, showing and saving the video
+parser = argparse.ArgumentParser(description="Count the steps of every person in a video.")
+parser.add_argument("--events", default=None,
+                    help="Write JSONL step events and summaries to this file ('-' for stdout) and skip rendering")
+args = parser.parse_args()
+
+# Initializing YOLO model for object detection, its weights found through the model registry (see models.py)
+model = load_yolo("yolov8n")
+
+# Running YOLO (people only) at most every 5 frames, and moving the tracked boxes in between
+scheduler = DetectionScheduler(model, every=5)
+
+# Initializing video capture
+cap = open_video_source("VIDEOS/INPUTS/people_jogging.mp4")
 
 # Getting video properties (width, height, FPS) for proper output file settings
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
+
+# Initializing one pose detector per tracked person, keeping at most 16 alive and closing those idle for 2 seconds
+detectors = PoseDetectorPool(max_detectors=16, max_idle_frames=2 * fps)
+
 filename = "VIDEOS/OUTPUTS/steps_counter.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h)) if args.events is None else None
+events = EventStream(args.events, fps) if args.events is not None else None
 
 # Ensures video capture opens successfully
 if not cap.isOpened():
     print("Error: Couldn't open the video!")
 
-# Initializing step count and movement stage for each person
-step_count = {}
-movement_stage = {}
+# Step count and movement stage of each person, as columns indexed by slot. People unseen for 10 seconds are
+# evicted and their slot reused, so memory follows how many people are in view, not how many ever passed by
+NO_STAGE, RIGHT_UP, LEFT_UP = 0, 1, 2
+
+
+def report_exits(evicted):
+    """Reporting the final step count of people who left, in headless mode."""
+    if events is not None:
+        for track_id, count, last_seen in zip(evicted["track_id"].tolist(), evicted["count"].tolist(),
+                                              evicted["last_seen"].tolist()):
+            events.emit("exit", last_seen, track_id, count=count)
+
+
+tracks = TrackTable({"count": (np.int32, 0), "stage": (np.int8, NO_STAGE)}, max_idle_frames=10 * fps,
+                    on_evict=report_exits)
+frame_index = 0
+
+# Labels are collected during the frame and composited in one pass, so they never end up in a later person's ROI
+hud = HUD()
 
 
-# Function to detect and count steps based on ankle movements
-def detect_and_count_steps(right_ankle, left_ankle, stage, count):
+# Function to detect and count steps based on ankle movements, for all visible people at once
+def detect_and_count_steps(right_ankle_y, left_ankle_y, stage, count):
     """
     Detect and count steps based on the position of ankles.
 
     Args:
-        right_ankle: Coordinates (x, y) of the right ankle.
-        left_ankle: Coordinates (x, y) of the left ankle.
-        stage: Current step stage ('right_up' or 'left_up').
-        count: Current step count.
+        right_ankle_y: Array with the y coordinate of every person's right ankle.
+        left_ankle_y: Array with the y coordinate of every person's left ankle.
+        stage: Array with every person's current step stage (NO_STAGE, RIGHT_UP or LEFT_UP).
+        count: Array with every person's current step count.
 
     Returns:
-        Updated stage and step count.
+        Updated stages and step counts.
     """
-    if right_ankle[1] < left_ankle[1] and stage != 'right_up':  # Right ankle goes above left
-        stage = 'right_up'
-        count += 1
-    elif left_ankle[1] < right_ankle[1] and stage != 'left_up':  # Left ankle goes above right
-        stage = 'left_up'
-        count += 1
-    return stage, count
+    # Right ankle above the left one means 'right_up', the other way round 'left_up'; every change is a step
+    new_stage = np.where(right_ankle_y < left_ankle_y, RIGHT_UP, np.where(left_ankle_y < right_ankle_y, LEFT_UP, stage))
+    return new_stage, count + (new_stage != stage)
 
 
 while cap.isOpened():
@@ -53,43 +83,57 @@ while cap.isOpened():
     if not ret:
         break
 
-    # YOLO model detects and tracks people in the current frame
-    results = model.track(frame, persist=True)
-    if results[0].boxes.id is not None:
-        bboxes = results[0].boxes.xyxy.int().cpu().tolist()
-        track_ids = results[0].boxes.id.int().cpu().tolist()
-        class_ids = results[0].boxes.cls.int().cpu().tolist()
-
-        # Looping through detected people in the frame
-        for bbox, track_id, class_id in zip(bboxes, track_ids, class_ids):
-            x1, y1, x2, y2 = bbox
-            class_name = class_names[class_id]
-
-            # Processing only 'person' detections
-            if class_name == 'person':
-                # Extracting the region of interest (ROI) for pose detection
-                ROI = frame[y1:y2, x1:x2]
-                ROI = detector.find_pose(ROI, draw=False)
-                landmarks = detector.get_positions(ROI)
-
-                # Ensure both ankle landmarks (left and right) are detected
-                if 27 in landmarks and 28 in landmarks:
-                    left_ankle = landmarks[27]
-                    right_ankle = landmarks[28]
-
-                    # Initializing step count and stage for new track IDs
-                    if track_id not in step_count:
-                        step_count[track_id] = 0
-                        movement_stage[track_id] = None
-
-                    # Updating movement stage and step count for the current person
-                    movement_stage[track_id], step_count[track_id] = detect_and_count_steps(
-                        right_ankle, left_ankle, movement_stage[track_id], step_count[track_id]
-                    )
-
-                    # Displaying track ID and step count on the frame
-                    draw_text_with_bg(frame, f"ID: {track_id}, Steps: {step_count[track_id]}", (x1, y1-20),
-                                      font_scale=0.8, thickness=2)
+    # YOLO detects and tracks people on scheduled frames; their boxes are predicted in between
+    visible_ids, right_ankle_y, left_ankle_y, label_positions = [], [], [], []
+    for track_id, (x1, y1, x2, y2) in scheduler.update(frame):
+        # Extracting the region of interest (ROI) for pose detection
+        ROI = frame[y1:y2, x1:x2]
+        detector = detectors.get(track_id, frame_index)
+        ROI = detector.find_pose(ROI, draw=False)
+        landmarks = detector.get_positions(ROI)
+
+        # Following the person with their pose's bounding box until the next detection
+        scheduler.report(track_id, landmark_box(detector.get_landmark_array(ROI), offset=(x1, y1)))
+
+        # Collecting the ankles (left and right) of everyone whose ankles are detected
+        if 27 in landmarks and 28 in landmarks:
+            visible_ids.append(track_id)
+            left_ankle_y.append(landmarks[27][1])
+            right_ankle_y.append(landmarks[28][1])
+            label_positions.append((x1, y1 - 20))
+
+    if visible_ids:
+        # Updating movement stage and step count of all visible people in one step
+        slots, _ = tracks.lookup(visible_ids, frame_index)
+        right_ankle_y, left_ankle_y = np.array(right_ankle_y), np.array(left_ankle_y)
+        previous_count = tracks["count"][slots]
+        tracks["stage"][slots], tracks["count"][slots] = detect_and_count_steps(
+            right_ankle_y, left_ankle_y, tracks["stage"][slots], previous_count
+        )
+
+        if events is not None:
+            # Emitting one event per step, with the vertical distance between the ankles
+            stepped = np.flatnonzero(tracks["count"][slots] > previous_count)
+            for i in stepped.tolist():
+                events.emit("step", frame_index, visible_ids[i], count=int(tracks["count"][slots[i]]),
+                            ankle_dy=int(right_ankle_y[i] - left_ankle_y[i]))
+        else:
+            # Displaying track ID and step count on the frame
+            for track_id, count, position in zip(visible_ids, tracks["count"][slots].tolist(), label_positions):
+                hud.add_text(f"ID: {track_id}, Steps: {count}", position, font_scale=0.8, thickness=2)
+
+    # Closing the detectors of people who left the frame, and forgetting people gone for 10 seconds
+    detectors.evict_idle(frame_index)
+    tracks.evict_idle(frame_index)
+    frame_index += 1
+
+    # Headless mode: periodic summaries only, nothing is drawn, shown or encoded
+    if events is not None:
+        events.maybe_summary(frame_index, tracks.values("count"))
+        continue
+
+    # Drawing all labels of this frame
+    hud.render(frame)
 
     # writing the frames for saving the video
     out.write(frame)
@@ -106,6 +150,10 @@ while cap.isOpened():
         break
 
 # Releasing resources
+detectors.close()
 cap.release()
-out.release()
-cv.destroyAllWindows()
+if events is not None:
+    events.close(frame_index, tracks.values("count"))
+else:
+    out.release()
+    cv.destroyAllWindows()
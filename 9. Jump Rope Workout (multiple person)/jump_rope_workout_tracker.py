@@ -1,51 +1,87 @@
+import argparse
 import cv2 as cv
-from ultralytics import YOLO
-from utils import draw_text_with_bg
+import numpy as np
+from detection_scheduler import DetectionScheduler
+from events import EventStream
+from models import load_yolo
+from track_table import TrackTable
+from utils import HUD
+from video_io import create_video_writer, open_video_source
+
+# Optional headless mode: a JSONL stream of jump events instead of drawing, showing and saving the video
+parser = argparse.ArgumentParser(description="Count the rope jumps of every person in a video.")
+parser.add_argument("--events", default=None,
+                    help="Write JSONL jump events and summaries to this file ('-' for stdout) and skip rendering")
+args = parser.parse_args()
 
 # Initialize YOLO model and video capture
-model = YOLO(r"D:\PyCharm\PyCharm_files\OBJECT DETECTION\YOLO_WEIGHTS\yolov8n.pt")  # replace this path with the path where the YOLOv8n model's weight is downloaded
-class_names = list(model.names.values())
-cap = cv.VideoCapture("VIDEOS/INPUTS/rope_jumping_2.mp4")
+model = load_yolo("yolov8n")  # Weights from $POSE_MODEL_YOLOV8N, $POSE_MODEL_DIR or ~/.cache/pose-tracking/models
+# People only, detected every 3 frames (or sooner) and tracked in between. Jumps are counted from the box centres
+# of detection frames only: predicted boxes extrapolate the fast up-and-down motion and would overshoot the jump band
+scheduler = DetectionScheduler(model, every=3)
+cap = open_video_source("VIDEOS/INPUTS/rope_jumping_2.mp4")
 w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
 filename = "VIDEOS/OUTPUTS/rope_jump_workout.mp4"
-out = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+out = create_video_writer(filename, fps, (w, h)) if args.events is None else None
+events = EventStream(args.events, fps) if args.events is not None else None
 
-# Initialize tracking and counting dictionaries
-jump_data = {track_id: {"count": 0, "in_jump": False, "rest_center": 0} for track_id in []}
-jump_thresholds = {}  # Jump thresholds per person
-colors = {}  # Color for each tracked ID
+def report_exits(evicted):
+    """Report the final jump count of people who left, in headless mode."""
+    if events is not None:
+        for track_id, count, last_seen in zip(evicted["track_id"].tolist(), evicted["count"].tolist(),
+                                              evicted["last_seen"].tolist()):
+            events.emit("exit", last_seen, track_id, count=count)
+
+# Initialize per-person tracking and counting columns; people unseen for 10 seconds are evicted and their slot reused
 default_threshold = {"low": 30, "high": 100}  # Default jump thresholds
+tracks = TrackTable({
+    "count": (np.int32, 0),
+    "in_jump": (bool, False),
+    "rest_center": (np.int32, 0),
+    "low": (np.int32, default_threshold["low"]),  # Jump thresholds per person
+    "high": (np.int32, default_threshold["high"]),
+    "color": (np.uint8, (0, 255, 0), (3,)),  # Color for each tracked ID, green until the first jump
+}, max_idle_frames=10 * fps, on_evict=report_exits)
+hud = HUD()  # Collects the labels of a frame and composites them in one pass
 
 # Helper functions
 def detect_jump(center_y, resting_center, low_thres, high_thres):
-    """Check if jump is detected based on center y-coordinate and thresholds."""
-    return resting_center - high_thres < center_y < resting_center - low_thres
-
-def process_person(track_id, bbox, center_y):
-    """Process each person detected, update jump count and color."""
-    if track_id not in jump_data:
-        jump_data[track_id] = {"count": 0, "in_jump": False, "rest_center": center_y}
-        jump_thresholds[track_id] = default_threshold  # Assign thresholds
-        colors[track_id] = (0, 255, 0)  # Default color
-
-    # Unpack necessary details
-    low_thres, high_thres = jump_thresholds[track_id]["low"], jump_thresholds[track_id]["high"]
-    rest_center = jump_data[track_id]["rest_center"]
-    jump_detected = detect_jump(center_y, rest_center, low_thres, high_thres)
-
-    # Update jump status
-    if jump_detected and not jump_data[track_id]["in_jump"]:
-        jump_data[track_id]["in_jump"] = True
-        jump_data[track_id]["count"] += 1
-        colors[track_id] = (255, 0, 0) if track_id == 1 else (0, 0, 255) if track_id == 2 else (255, 255, 0)
-    elif not jump_detected:
-        jump_data[track_id]["in_jump"] = False
-
-def draw_timer(frame, current_frame, fps):
-    """Draw timer and jump counts on the frame based on frame number and fps."""
+    """Check which people are jumping based on their center y-coordinates and thresholds (arrays)."""
+    return (resting_center - high_thres < center_y) & (center_y < resting_center - low_thres)
+
+def jump_colors(track_ids):
+    """Colors shown once a person jumps: blue for ID 1, red for ID 2, cyan for everyone else."""
+    track_ids = track_ids[:, None]
+    return np.where(track_ids == 1, (255, 0, 0), np.where(track_ids == 2, (0, 0, 255), (255, 255, 0)))
+
+def process_people(track_ids, center_y, frame_index, measured=True):
+    """Process every detected person at once, update jump counts and colors, and return their slots.
+
+    Only measured boxes (frames YOLO ran on) update the jump state; predicted ones just keep the tracks alive.
+    """
+    slots, new = tracks.lookup(track_ids.tolist(), frame_index)
+    tracks["rest_center"][slots[new]] = center_y[new]  # The first position seen is the resting position
+    if not measured:
+        return slots
+
+    jumping = detect_jump(center_y, tracks["rest_center"][slots], tracks["low"][slots], tracks["high"][slots])
+    started = jumping & ~tracks["in_jump"][slots]
+    tracks["count"][slots] += started
+    tracks["color"][slots[started]] = jump_colors(track_ids[started])
+    tracks["in_jump"][slots] = jumping
+
+    if events is not None:
+        # One event per jump, with the height of the box center above the resting position
+        for i in np.flatnonzero(started).tolist():
+            events.emit("jump", frame_index, int(track_ids[i]), count=int(tracks["count"][slots[i]]),
+                        height=int(tracks["rest_center"][slots[i]] - center_y[i]))
+    return slots
+
+def draw_timer(hud, current_frame, fps):
+    """Queue the timer label on the HUD based on frame number and fps."""
     elapsed_time = current_frame / fps  # Elapsed time based on frame number and fps
     time_display = f"{int(elapsed_time // 60)}:{int(elapsed_time % 60):02}"
-    draw_text_with_bg(frame, time_display, (5, 50), font_scale=2, thickness=2, bg_color=(255, 255, 255), text_color=(0, 0, 0))
+    hud.add_text(time_display, (5, 50), font_scale=2, thickness=2, bg_color=(255, 255, 255), text_color=(0, 0, 0))
 
 current_frame = 0  # Initialize frame counter
 
@@ -54,23 +90,31 @@ while cap.isOpened():
     if not ret:
         break
 
-    # Run YOLO model and get results
-    results = model.track(frame, persist=True)
-    if results[0].boxes.id is not None:
-        for bbox, track_id, class_id in zip(results[0].boxes.xyxy.int().cpu().tolist(),
-                                            results[0].boxes.id.int().cpu().tolist(),
-                                            results[0].boxes.cls.int().cpu().tolist()):
-            if class_names[class_id] == 'person':
-                center_y = (bbox[1] + bbox[3]) // 2  # Calculate bounding box center
-                process_person(track_id, bbox, center_y)  # Process person tracking
-
-                # Draw jump count on the frame
-                draw_text_with_bg(frame, f"ID: {track_id}, Jumps: {jump_data[track_id]['count']}",
-                                  (bbox[0] - 100, center_y), font_scale=0.8, thickness=2, bg_color=colors[track_id],
-                                  text_color=(0, 0, 0))
+    # Get the people's boxes, detected by YOLO on scheduled frames and predicted in between
+    people = scheduler.update(frame)
+    if people:
+        track_ids = np.array([track_id for track_id, _ in people])
+        bboxes = np.array([bbox for _, bbox in people])
+        center_y = (bboxes[:, 1] + bboxes[:, 3]) // 2  # Calculate bounding box centers
+        slots = process_people(track_ids, center_y, current_frame, scheduler.detected)  # Process person tracking
+
+        # Draw jump counts on the frame (unless headless)
+        labels = zip(track_ids.tolist(), bboxes[:, 0].tolist(), center_y.tolist(), tracks["count"][slots].tolist(),
+                     tracks["color"][slots].tolist()) if events is None else ()
+        for track_id, x1, y, count, color in labels:
+            hud.add_text(f"ID: {track_id}, Jumps: {count}", (x1 - 100, y), font_scale=0.8, thickness=2,
+                         bg_color=tuple(color), text_color=(0, 0, 0))
+    tracks.evict_idle(current_frame)
+
+    # Headless mode: periodic summaries only, nothing is drawn, shown or encoded
+    if events is not None:
+        current_frame += 1
+        events.maybe_summary(current_frame, tracks.values("count"))
+        continue
 
     # Draw time overlay based on frame number and fps
-    draw_timer(frame, current_frame, fps)
+    draw_timer(hud, current_frame, fps)
+    hud.render(frame)
     out.write(frame)  # Write to output file
 
     # Display resized frame
@@ -86,5 +130,8 @@ while cap.isOpened():
 
 # Release resources
 cap.release()
-out.release()
-cv.destroyAllWindows()
+if events is not None:
+    events.close(current_frame, tracks.values("count"))
+else:
+    out.release()
+    cv.destroyAllWindows()
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def calculate_angles(a, b, c):
+    """
+    Calculating the angles formed at b by the points a, b and c, for any number of triples in one call.
+
+    Args:
+        a: First points (e.g., shoulders), array-like of shape (..., 2) or (..., 3).
+        b: Middle points (e.g., elbows), broadcastable against a.
+        c: Third points (e.g., wrists), broadcastable against a.
+
+    Returns:
+        angles: Angles in degrees between the vectors ab and bc, with the broadcast leading shape.
+                Triples with a zero-length vector (or NaN points) get NaN, which passes no threshold.
+    """
+    dtype = np.result_type(np.asarray(a), np.asarray(b), np.asarray(c), np.float32)
+    a, b, c = (np.asarray(p, dtype=dtype) for p in (a, b, c))
+
+    ab, bc = a - b, c - b  # Creating vectors from point b to a, and point b to c
+    dot = np.einsum('...i,...i->...', ab, bc)
+    norms = np.sqrt(np.einsum('...i,...i->...', ab, ab) * np.einsum('...i,...i->...', bc, bc))
+
+    # Dividing only where both vectors have a length, degenerate triples stay NaN
+    cosine_angle = np.divide(dot, norms, out=np.full_like(dot, np.nan), where=norms > 0)
+    np.clip(cosine_angle, -1.0, 1.0, out=cosine_angle)  # Clipping to prevent domain error in arccos
+    return np.degrees(np.arccos(cosine_angle, out=cosine_angle), out=cosine_angle)
+
+
+def calculate_angle(a, b, c):
+    """
+    Calculating the angle formed by three points.
+
+    Args:
+        a: First point (e.g., shoulder) [x, y].
+        b: Middle point (e.g., elbow) [x, y].
+        c: Third point (e.g., wrist) [x, y].
+
+    Returns:
+        angle: Angle in degrees between the vectors ab and bc.
+    """
+    return float(calculate_angles(a, b, c))
+
+
+def joint_angles(landmarks, triples, dims=2):
+    """
+    Calculating the angles of many joint triples on landmark arrays in a single vectorized call.
+
+    Args:
+        landmarks: Landmark array of shape (..., 33, 4) as returned by PoseDetector.get_landmark_array,
+                   stacked over any number of leading frame/person dimensions.
+        triples: Sequence of (a, b, c) landmark IDs, e.g. [(12, 14, 16), (11, 13, 15)].
+        dims: Number of coordinates to use, 2 for (x, y) like the counters or 3 to include z.
+
+    Returns:
+        angles: Array of shape (..., len(triples)) with the angle at b of every triple, in degrees.
+    """
+    triples = np.asarray(triples, dtype=np.intp).reshape(-1, 3)
+    points = np.asarray(landmarks)[..., :dims]
+
+    # Gathering all triples at once: (..., K, 3, dims)
+    gathered = points[..., triples, :]
+    return calculate_angles(gathered[..., 0, :], gathered[..., 1, :], gathered[..., 2, :])
@@ -0,0 +1,3 @@
+"""
+Benchmarks of the pose pipeline on synthetic videos, run with `python -m benchmarks` from the repository root.
+"""
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+from benchmarks.synthetic import generate_video
+from exercises import RULES, RuleEngine
+from metrics import metrics
+from Pose_estimationModule import PoseDetector
+from utils import HUD, draw_text_with_bg
+from video_io import create_video_writer, open_video_source
+
+# Reported stages and the metrics histograms they come from. decode, convert, inference, find_pose and encode are
+# recorded by the instrumented modules themselves; the others are timed by benchmark_video.
+STAGES = {"decode": "read", "convert": "preprocess", "inference": "pose_process", "find_pose": "find_pose",
+          "extract": "extract", "count": "count", "draw": "draw", "encode": "write"}
+
+
+def _summarize(histogram):
+    """ Latency statistics of one stage, in milliseconds. """
+    if histogram is None:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "total_s": 0.0}
+    return dict(histogram.summary(), total_s=histogram.sum)
+
+
+def benchmark_video(video_path, truth, complexity=1, encode_path=None):
+    """
+    Runs every stage of an exercise script on a video and times each one separately.
+
+    Frames go through the same calls as in the scripts (open_video_source, PoseDetector.find_pose,
+    create_video_writer), and the per-stage latencies are read from their metrics histograms. convert and
+    inference only cover the frames MediaPipe actually ran on, find_pose covers every frame.
+
+    Counting and drawing use the detected landmarks, or the ground-truth landmarks of the first figure on frames
+    where MediaPipe finds no pose, so those stages are always exercised.
+
+    Args:
+        video_path: Path of the video.
+        truth: Ground-truth landmarks of shape (frames, persons, 33, 4), as returned by generate_video.
+        complexity: MediaPipe model complexity.
+        encode_path: Path the annotated frames are encoded to.
+
+    Returns:
+        Dictionary with the frame count, frames/sec over all stages, detection rate, per-stage latencies and the
+        time of counting the whole session at once with RuleEngine.count_session.
+    """
+    detector = PoseDetector(complexity=complexity)
+    engine = RuleEngine(list(RULES))
+    hud = HUD()
+    clock = time.perf_counter
+
+    cap = open_video_source(video_path)
+    w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
+    out = create_video_writer(encode_path, fps, (w, h))
+    session = np.full((len(truth), 33, 4), np.nan, dtype=np.float32)
+
+    # Recording this video's stages only, leaving instrumentation as it was found
+    was_enabled = metrics.enabled
+    metrics.reset()
+    metrics.enabled = True
+
+    frames = detected = 0
+    start = clock()
+    try:
+        while frames < len(truth):
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            detector.find_pose(frame, draw=False)
+            with metrics.timer("extract"):
+                landmarks = detector.get_landmark_array(frame)
+
+            if landmarks is None:
+                landmarks = truth[frames, 0]
+            else:
+                detected += 1
+            session[frames] = landmarks
+
+            with metrics.timer("count"):
+                engine.update(landmarks)
+            with metrics.timer("draw"):
+                for person_landmarks in truth[frames]:
+                    detector.renderer.draw(frame, person_landmarks)
+                engine.draw(hud, landmarks)
+                hud.render(frame)
+                draw_text_with_bg(frame, f"Frame: {frames}", (0, h - 40), font_scale=1, thickness=2)
+            out.write(frame)
+            frames += 1
+        elapsed = clock() - start
+    finally:
+        metrics.enabled = was_enabled
+    histograms = dict(metrics.histograms)
+
+    cap.release()
+    out.release()
+    detector.close()
+
+    # Counting the same landmarks again as one session, the way rescore.py does
+    t0 = clock()
+    RuleEngine(list(RULES)).count_session(session[:frames])
+    batch_count_s = clock() - t0
+
+    return {
+        "frames": frames,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "detection_rate": detected / max(frames, 1),
+        "stages": {stage: _summarize(histograms.get(name)) for stage, name in STAGES.items()},
+        "batch_count_s": batch_count_s,
+        "writer": type(out).__name__,
+    }
+
+
+def _environment():
+    versions = {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv.__version__}
+    try:
+        import mediapipe as mp
+        versions["mediapipe"] = mp.__version__
+    except (ImportError, AttributeError):
+        versions["mediapipe"] = None
+    return {"platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count(),
+            "versions": versions}
+
+
+def run_benchmarks(resolutions=((640, 360), (1280, 720), (1920, 1080)), lengths=(150,), persons=(1,),
+                   complexity=1, work_dir=None):
+    """
+    Generates a synthetic video for every resolution/length/person-count combination and benchmarks it.
+
+    Returns:
+        Dictionary with the environment and one result per configuration.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as directory:
+        for width, height in resolutions:
+            for frames in lengths:
+                for person_count in persons:
+                    name = f"{width}x{height}_{frames}f_{person_count}p"
+                    video_path = os.path.join(directory, name + ".mp4")
+                    truth = generate_video(video_path, width, height, frames, person_count)
+                    result = benchmark_video(video_path, truth, complexity,
+                                             encode_path=os.path.join(directory, name + "_out.mp4"))
+                    result.update({"name": name, "width": width, "height": height, "persons": person_count})
+                    results.append(result)
+                    print(f"{name:>22}: {result['fps']:7.1f} fps, detected {result['detection_rate']:4.0%}, " +
+                          ", ".join(f"{stage} {result['stages'][stage]['p50_ms']:.2f}" for stage in STAGES) +
+                          " (p50 ms)")
+    return {"environment": _environment(), "complexity": complexity, "results": results}
+
+
+def _resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pose pipeline on synthetic videos.")
+    parser.add_argument("--resolutions", type=_resolution, nargs="+", default=[(640, 360), (1280, 720), (1920, 1080)],
+                        help="Frame sizes as WIDTHxHEIGHT")
+    parser.add_argument("--frames", type=int, nargs="+", default=[150], help="Video lengths in frames")
+    parser.add_argument("--persons", type=int, nargs="+", default=[1], help="Numbers of figures per video")
+    parser.add_argument("--complexity", type=int, default=1, help="MediaPipe model complexity (0, 1 or 2)")
+    parser.add_argument("--output", default="benchmark.json", help="Path of the JSON report")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.resolutions, args.frames, args.persons, args.complexity)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import math
+
+import cv2 as cv
+import numpy as np
+
+from video_io import OpenCVWriter
+
+# Bones drawn for the synthetic figures, as (landmark ID, landmark ID)
+_BONES = ((11, 12), (11, 13), (13, 15), (12, 14), (14, 16), (11, 23), (12, 24), (23, 24), (23, 25), (25, 27),
+          (24, 26), (26, 28), (27, 31), (28, 32))
+
+
+def synthetic_pose(t, center_x, ground_y, height, period=2.0):
+    """
+    Landmarks of a figure doing squats with arm raises, at time t in seconds.
+
+    Args:
+        t: Time in seconds.
+        center_x: x of the figure's centre line in pixels.
+        ground_y: y of the floor in pixels.
+        height: Figure height in pixels.
+        period: Duration of one repetition in seconds.
+
+    Returns:
+        A (33, 4) float32 array of pixel-space (x, y, z, visibility) like PoseDetector.get_landmark_array.
+    """
+    depth = 0.5 * (1 - math.cos(2 * math.pi * t / period))  # 0 standing, 1 at the bottom of the squat
+    segment = 0.24 * height
+    landmarks = np.zeros((33, 4), dtype=np.float32)
+    landmarks[:, 3] = 1.0
+
+    for side, sign in ((0, 1), (1, -1)):  # Left landmarks have even offsets from 11 and appear on the right
+        ankle = (center_x + sign * 0.08 * height, ground_y - 0.04 * height)
+        knee = (ankle[0] + sign * 0.1 * height * depth, ankle[1] - segment * (1 - 0.15 * depth))
+        hip = (center_x + sign * 0.06 * height, knee[1] - segment * (1 - 0.6 * depth))
+        shoulder = (center_x + sign * 0.1 * height, hip[1] - 0.3 * height)
+        raise_angle = math.pi * 0.9 * depth
+        elbow = (shoulder[0] + sign * 0.15 * height * math.sin(raise_angle),
+                 shoulder[1] + 0.15 * height * math.cos(raise_angle))
+        wrist = (elbow[0] + sign * 0.14 * height * math.sin(raise_angle),
+                 elbow[1] + 0.14 * height * math.cos(raise_angle))
+
+        landmarks[11 + side, :2] = shoulder
+        landmarks[13 + side, :2] = elbow
+        landmarks[[15 + side, 17 + side, 19 + side, 21 + side], :2] = wrist
+        landmarks[23 + side, :2] = hip
+        landmarks[25 + side, :2] = knee
+        landmarks[[27 + side, 29 + side], :2] = ankle
+        landmarks[31 + side, :2] = (ankle[0] + sign * 0.05 * height, ground_y)
+
+    # Face landmarks around the head, above the shoulders
+    head = landmarks[11:13, :2].mean(axis=0) - (0, 0.12 * height)
+    landmarks[:11, :2] = head
+    landmarks[[2, 5, 7, 8], 0] += np.array([1, -1, 2, -2], dtype=np.float32) * 0.025 * height
+    return landmarks
+
+
+def draw_figure(frame, landmarks, height, color=(80, 150, 220)):
+    """ Draws a synthetic figure's limbs and head, thick enough to look like a person to a detector. """
+    points = landmarks[:, :2].astype(np.int32)
+    thickness = max(2, int(0.05 * height))
+    for a, b in _BONES:
+        cv.line(frame, tuple(points[a]), tuple(points[b]), color, thickness, cv.LINE_AA)
+    cv.circle(frame, tuple(points[0]), max(3, int(0.06 * height)), color, -1, cv.LINE_AA)
+
+
+def generate_video(path, width=1280, height=720, frames=150, persons=1, fps=30):
+    """
+    Writes a synthetic exercise video with any number of figures side by side.
+
+    Args:
+        path: Output video path (.mp4).
+        width, height: Frame size in pixels.
+        frames: Number of frames.
+        persons: Number of figures, each with its own phase.
+        fps: Frame rate.
+
+    Returns:
+        Ground-truth landmarks of shape (frames, persons, 33, 4) in pixels.
+    """
+    writer = OpenCVWriter(path, fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Couldn't open a video writer for {path}")
+
+    # Background: a floor and a wall gradient, so the frames are not trivially compressible
+    background = np.empty((height, width, 3), dtype=np.uint8)
+    background[:] = np.linspace(90, 170, height, dtype=np.uint8)[:, None, None]
+    background[int(0.9 * height):] = (60, 70, 80)
+
+    figure_height = 0.8 * height
+    centers = (np.arange(persons) + 0.5) * width / persons
+    truth = np.empty((frames, persons, 33, 4), dtype=np.float32)
+    for index in range(frames):
+        frame = background.copy()
+        for person, center_x in enumerate(centers):
+            landmarks = synthetic_pose(index / fps + 0.37 * person, center_x, 0.92 * height, figure_height)
+            draw_figure(frame, landmarks, figure_height)
+            truth[index, person] = landmarks
+        writer.write(frame)
+    writer.release()
+    return truth
@@ -0,0 +1,168 @@
+import operator
+
+import numpy as np
+
+# Comparison operators usable in counter thresholds
+_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+class HysteresisCounter:
+    """
+    Two-stage repetition counter, the state machine behind update_count_and_color_by_angle.
+
+    On every frame, a value matching reset_when puts the counter in reset_stage; otherwise a value matching
+    count_when while in reset_stage counts a repetition and moves it to count_stage.
+    """
+
+    def __init__(self, reset_when, count_when, reset_stage="down", count_stage="up", initial_stage=None):
+        """
+        Args:
+            reset_when: (op, threshold) tuple, e.g. ('>', 100) for "angle > 100".
+            count_when: (op, threshold) tuple that counts a repetition when in reset_stage.
+            reset_stage: Stage entered when reset_when matches.
+            count_stage: Stage entered when a repetition is counted.
+            initial_stage: Stage before the first frame (None in most scripts).
+        """
+        self.reset_when, self.count_when = tuple(reset_when), tuple(count_when)
+        self.reset_stage, self.count_stage = reset_stage, count_stage
+        self.initial_stage = initial_stage
+        self._reset_op, self._count_op = _OPS[reset_when[0]], _OPS[count_when[0]]
+
+        # Every stage the counter can be in at a frame boundary
+        self.stages = tuple(dict.fromkeys((initial_stage, reset_stage, count_stage)))
+
+    def step(self, value, stage, count):
+        if self._reset_op(value, self.reset_when[1]):
+            return self.reset_stage, count
+        if self._count_op(value, self.count_when[1]) and stage == self.reset_stage:
+            return self.count_stage, count + 1
+        return stage, count
+
+    def run(self, values, stage=None, count=0):
+        """ Feeds a sequence of values through the counter and returns the final stage and count. """
+        for value in values:
+            stage, count = self.step(value, stage, count)
+        return stage, count
+
+    def run_batch(self, values, stage=None):
+        """
+        Vectorized equivalent of run() over a whole series of values, e.g. a session's signal.
+
+        Only frames matching one of the comparisons can change the stage. A reset frame always enters reset_stage;
+        a counting frame counts (and enters count_stage) exactly when the previous such frame was a reset frame,
+        or, for the first one, when the entry stage is reset_stage. NaN values (frames without a pose) match
+        neither comparison, just as skipped frames leave the streaming counter unchanged.
+
+        Args:
+            values: 1D sequence of signal values.
+            stage: Stage before the first value.
+
+        Returns:
+            Dictionary with the final stage, the count, the frame indices of the repetitions ('reps'), and the
+            frame indices where the stage changes ('transitions') with the stage entered at each ('stages').
+        """
+        values = np.asarray(values, dtype=float)
+        reset = self._reset_op(values, self.reset_when[1])
+        counting = self._count_op(values, self.count_when[1]) & ~reset
+
+        events = np.flatnonzero(reset | counting)
+        is_reset = reset[events]
+        after_reset = np.concatenate(([stage == self.reset_stage], is_reset))[:-1]
+
+        # A reset frame is a transition unless the stage already was reset_stage; a counting frame is one
+        # (and a repetition) only right after a reset
+        changed = is_reset != after_reset
+        reps = events[~is_reset & after_reset]
+        stages = np.where(is_reset[changed], self.reset_stage, self.count_stage).tolist()
+        return {"stage": stages[-1] if stages else stage, "count": len(reps), "reps": reps,
+                "transitions": events[changed], "stages": stages}
+
+    def transfer(self, values):
+        """
+        Summarizes a segment of values for every possible entry stage.
+
+        Returns:
+            Dictionary mapping each entry stage to the (exit stage, repetitions counted) of the segment.
+            Segments processed independently can be chained with stitch() to give the sequential result.
+        """
+        summaries = {}
+        for stage in self.stages:
+            result = self.run_batch(values, stage)
+            summaries[stage] = (result["stage"], result["count"])
+        return summaries
+
+
+class AlternatingCounter(HysteresisCounter):
+    """
+    Counter for alternating movements, the state machine behind detect_and_count_steps.
+
+    A value matching first_when counts one step unless the counter is already in first_stage, and likewise
+    for second_when and second_stage.
+    """
+
+    def __init__(self, first_when=("<", 0), second_when=(">", 0), first_stage="right_up", second_stage="left_up",
+                 initial_stage=None):
+        super().__init__(first_when, second_when, reset_stage=first_stage, count_stage=second_stage,
+                         initial_stage=initial_stage)
+
+    def step(self, value, stage, count):
+        if self._reset_op(value, self.reset_when[1]) and stage != self.reset_stage:
+            return self.reset_stage, count + 1
+        if self._count_op(value, self.count_when[1]) and stage != self.count_stage:
+            return self.count_stage, count + 1
+        return stage, count
+
+    def run_batch(self, values, stage=None):
+        """
+        Vectorized equivalent of run(), see HysteresisCounter.run_batch.
+
+        Every frame matching first_when or second_when enters that stage, so it counts exactly when it differs
+        from the previous matching frame (or, for the first one, from the entry stage).
+        """
+        values = np.asarray(values, dtype=float)
+        first = self._reset_op(values, self.reset_when[1])
+        second = self._count_op(values, self.count_when[1])
+
+        if np.any(first & second):
+            # Overlapping thresholds make the stage toggle on frames matching both, stepping is the exact answer
+            reps, stages = [], []
+            for index, value in enumerate(values.tolist()):
+                new_stage, counted = self.step(value, stage, 0)
+                if counted:
+                    reps.append(index)
+                    stages.append(new_stage)
+                stage = new_stage
+            reps = np.asarray(reps, dtype=np.intp)
+            return {"stage": stage, "count": len(reps), "reps": reps, "transitions": reps, "stages": stages}
+
+        events = np.flatnonzero(first | second)
+        is_first = first[events]
+        entry = 0 if stage == self.reset_stage else 1 if stage == self.count_stage else -1
+        kinds = np.where(is_first, 0, 1)
+        changed = kinds != np.concatenate(([entry], kinds))[:-1]
+
+        # Every stage change is a step here
+        reps = events[changed]
+        stages = np.where(is_first[changed], self.reset_stage, self.count_stage).tolist()
+        return {"stage": stages[-1] if stages else stage, "count": len(reps), "reps": reps, "transitions": reps,
+                "stages": stages}
+
+
+def stitch(counter, summaries, stage=None):
+    """
+    Chains per-segment transfer() summaries, in order, into the stage and count of a sequential run.
+
+    Args:
+        counter: The counter the summaries were computed with.
+        summaries: Sequence of dictionaries returned by counter.transfer().
+        stage: Stage before the first segment, the counter's initial stage by default.
+
+    Returns:
+        Final stage and total count.
+    """
+    stage = counter.initial_stage if stage is None else stage
+    total = 0
+    for summary in summaries:
+        stage, count = summary[stage]
+        total += count
+    return stage, total
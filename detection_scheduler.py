@@ -0,0 +1,169 @@
+import cv2 as cv
+import numpy as np
+
+from metrics import metrics
+
+# COCO class ID of 'person'
+PERSON_CLASS = 0
+
+
+class DetectionScheduler:
+    """
+    Runs YOLO tracking only when it is needed and predicts the tracked boxes in between.
+
+    model.track() runs on the first frame and then every `every` frames, restricted to the person class at the
+    source. It runs sooner when:
+      - the mean confidence of the last detection dropped below min_confidence,
+      - a predicted box reaches the frame border (someone may be leaving or entering),
+      - the frame border changed noticeably since the last detection (someone may be entering), or
+      - the caller reported a track as lost with report(track_id, None).
+    In between, each box is moved by its last measured velocity (a constant-velocity motion model), or
+    replaced by a pose-derived box given to report(). After update(), `detected` tells whether the boxes of that
+    frame were measured by YOLO or predicted, for callers whose signal must come from measured boxes only.
+    """
+
+    def __init__(self, model, every=5, min_confidence=0.5, classes=(PERSON_CLASS,), border=0.05,
+                 border_change=12.0, **track_kwargs):
+        """
+        Args:
+            model: ultralytics YOLO model.
+            every: Maximum number of frames between two detections (1 runs YOLO on every frame).
+            min_confidence: Mean box confidence below which the next frame is detected again.
+            classes: Class IDs detected by YOLO, the person class by default.
+            border: Width of the frame border watched for entries, as a fraction of the frame size.
+            border_change: Mean absolute grey-level change of the border (0-255) that triggers a detection.
+            track_kwargs: Extra keyword arguments for model.track(), e.g. conf or tracker.
+        """
+        self.model = model
+        self.every = every
+        self.min_confidence = min_confidence
+        self.border = border
+        self.border_change = border_change
+        self.track_kwargs = dict(track_kwargs, persist=True, classes=list(classes), verbose=False)
+
+        self.boxes = np.zeros((0, 4), dtype=np.float32)  # (x1, y1, x2, y2) of every track
+        self.velocities = np.zeros((0, 4), dtype=np.float32)  # Box motion in pixels per frame
+        self.track_ids = []
+        self.confidence = 0.0
+        self.frame_index = -1
+        self.detections = 0  # Number of frames YOLO ran on
+        self.detected = False  # Whether YOLO ran on the last frame given to update()
+        self._last_detection = None
+        self._detected = {}  # track_id -> box at the last detection, the reference for velocities
+        self._force = True
+        self._border_reference = None
+
+    def _border_signature(self, frame):
+        # Tiny greyscale thumbnail of the frame, whose border pixels are compared between frames
+        small = cv.resize(frame, (64, 36), interpolation=cv.INTER_AREA)
+        return cv.cvtColor(small, cv.COLOR_BGR2GRAY).astype(np.float32)
+
+    def _border_changed(self, signature):
+        if self._border_reference is None:
+            return True
+        bw, bh = max(1, int(self.border * 64)), max(1, int(self.border * 36))
+        diff = np.abs(signature - self._border_reference)
+        mask = np.ones_like(diff, dtype=bool)
+        mask[bh:-bh, bw:-bw] = False
+        return float(diff[mask].mean()) > self.border_change
+
+    def _needs_detection(self, frame, signature):
+        if self._force or self._last_detection is None:
+            return True
+        if self.frame_index - self._last_detection >= self.every:
+            return True
+        if len(self.track_ids) and self.confidence < self.min_confidence:
+            return True
+
+        # Boxes touching the border: the person may be leaving, and their neighbours entering
+        h, w = frame.shape[:2]
+        margin_x, margin_y = self.border * w, self.border * h
+        if len(self.boxes) and (np.any(self.boxes[:, :2] < (margin_x, margin_y)) or
+                                np.any(self.boxes[:, 2:] > (w - margin_x, h - margin_y))):
+            return True
+        return self._border_changed(signature)
+
+    def _detect(self, frame, signature):
+        with metrics.timer("model_track"):
+            results = self.model.track(frame, **self.track_kwargs)
+        boxes = results[0].boxes
+        frames = self.frame_index - self._last_detection if self._last_detection is not None else 0
+
+        if boxes.id is None:
+            new_boxes, track_ids, confidence = np.zeros((0, 4), dtype=np.float32), [], 1.0
+        else:
+            new_boxes = boxes.xyxy.cpu().numpy().astype(np.float32)
+            track_ids = boxes.id.int().cpu().tolist()
+            confidence = float(boxes.conf.cpu().numpy().mean())
+
+        # Velocity of each track from its previously detected box, zero for new tracks
+        velocities = np.zeros_like(new_boxes)
+        if frames:
+            for row, track_id in enumerate(track_ids):
+                if track_id in self._detected:
+                    velocities[row] = (new_boxes[row] - self._detected[track_id]) / frames
+
+        self.boxes, self.velocities, self.track_ids = new_boxes, velocities, track_ids
+        self._detected = dict(zip(track_ids, new_boxes.copy()))
+        self.confidence = confidence
+        self._last_detection = self.frame_index
+        self._border_reference = signature
+        self._force = False
+        self.detections += 1
+
+    def update(self, frame):
+        """
+        Returns the person boxes of a frame, detected or predicted.
+
+        Returns:
+            List of (track_id, (x1, y1, x2, y2)) with integer coordinates clipped to the frame.
+        """
+        self.frame_index += 1
+        # Detecting every frame anyway, there is no border thumbnail or motion check to compute
+        signature = self._border_signature(frame) if self.every > 1 else None
+        self.detected = self.every <= 1 or self._needs_detection(frame, signature)
+        if self.detected:
+            self._detect(frame, signature)
+        else:
+            self.boxes += self.velocities
+
+        h, w = frame.shape[:2]
+        boxes = np.clip(self.boxes, 0, (w, h, w, h)).astype(np.int32).tolist()
+        return [(track_id, tuple(box)) for track_id, box in zip(self.track_ids, boxes)
+                if box[2] > box[0] and box[3] > box[1]]
+
+    def report(self, track_id, box):
+        """
+        Feeds back a track's pose-derived box (x1, y1, x2, y2) for the current frame, or None when no pose was
+        found in its box, which makes the next frame a detection frame.
+        """
+        if track_id not in self.track_ids:
+            return
+        if box is None:
+            self._force = True
+            return
+        row = self.track_ids.index(track_id)
+        self.boxes[row] = box
+
+
+def landmark_box(landmarks, offset=(0, 0), padding=0.15, min_visibility=0.5):
+    """
+    Bounding box of a pose's visible landmarks, padded, in frame pixels.
+
+    Args:
+        landmarks: (33, 4) pixel-space landmark array of a crop, from PoseDetector.get_landmark_array.
+        offset: (x, y) of the crop in the frame.
+        padding: Padding on every side, as a fraction of the box size.
+        min_visibility: Minimum visibility of the landmarks included.
+
+    Returns:
+        (x1, y1, x2, y2), or None when no landmark is visible.
+    """
+    if landmarks is None:
+        return None
+    points = landmarks[landmarks[:, 3] >= min_visibility, :2]
+    if not len(points):
+        return None
+    (x1, y1), (x2, y2) = points.min(axis=0), points.max(axis=0)
+    pad_x, pad_y = padding * (x2 - x1), padding * (y2 - y1)
+    return (x1 - pad_x + offset[0], y1 - pad_y + offset[1], x2 + pad_x + offset[0], y2 + pad_y + offset[1])
@@ -0,0 +1,53 @@
+import json
+import sys
+import time
+
+
+class EventStream:
+    """
+    Newline-delimited JSON stream of counting events, for headless runs that need the counts but not the video.
+
+    Every line is one JSON object with a 'type' ('rep', 'step', 'jump' or 'summary'), the frame index, the video
+    time 't' in seconds, the track ID (null for single-person exercises) and event-specific fields such as the
+    count and the joint angle. Summaries with every count are written every summary_interval seconds of video
+    and once more when the stream is closed.
+    """
+
+    def __init__(self, path="-", fps=30, summary_interval=10.0):
+        """
+        Args:
+            path: Output file, or '-' for stdout.
+            fps: Frame rate of the video, used for the event timestamps.
+            summary_interval: Seconds of video between two summaries, None for a final summary only.
+        """
+        self.file = sys.stdout if path == "-" else open(path, "w")
+        self.fps = fps or 30
+        self.summary_frames = int(summary_interval * self.fps) if summary_interval else None
+        self.events = 0
+        self._last_summary = 0
+        self._started = time.perf_counter()
+
+    def emit(self, event, frame_index, track_id=None, **fields):
+        record = {"type": event, "frame": frame_index, "t": round(frame_index / self.fps, 3), "track_id": track_id}
+        record.update(fields)
+        self.file.write(json.dumps(record) + "\n")
+        self.events += 1
+
+    def summary(self, frame_index, counts, **fields):
+        """ Writes a summary of the counts so far, e.g. {'squats': 12} or {'7': 240} per track. """
+        elapsed = time.perf_counter() - self._started
+        self.emit("summary", frame_index, counts=counts, processing_fps=round(frame_index / elapsed, 1) if elapsed else 0.0,
+                  **fields)
+        self.file.flush()
+        self._last_summary = frame_index
+
+    def maybe_summary(self, frame_index, counts, **fields):
+        """ Writes a summary if summary_interval seconds of video went by since the last one. """
+        if self.summary_frames and frame_index - self._last_summary >= self.summary_frames:
+            self.summary(frame_index, counts, **fields)
+
+    def close(self, frame_index, counts, **fields):
+        """ Writes the final summary and closes the file. """
+        self.summary(frame_index, counts, final=True, **fields)
+        if self.file is not sys.stdout:
+            self.file.close()
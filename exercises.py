@@ -0,0 +1,319 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from angles import joint_angles
+from counters import AlternatingCounter, HysteresisCounter
+
+# MediaPipe Pose landmark names, in landmark ID order
+LANDMARK_NAMES = (
+    "nose", "left_eye_inner", "left_eye", "left_eye_outer", "right_eye_inner", "right_eye", "right_eye_outer",
+    "left_ear", "right_ear", "mouth_left", "mouth_right", "left_shoulder", "right_shoulder", "left_elbow",
+    "right_elbow", "left_wrist", "right_wrist", "left_pinky", "right_pinky", "left_index", "right_index",
+    "left_thumb", "right_thumb", "left_hip", "right_hip", "left_knee", "right_knee", "left_ankle", "right_ankle",
+    "left_heel", "right_heel", "left_foot_index", "right_foot_index",
+)
+LANDMARK_IDS = {name: index for index, name in enumerate(LANDMARK_NAMES)}
+
+# Counting rules of the exercise scripts, with the thresholds used by each script. A rule is either
+#   - "angle": (a, b, c), the joint angle at b in degrees, or
+#   - "compare": (p, q), y[p] - y[q] in pixels (negative when p is above q),
+# with landmark names prefixed by "side" unless they already name a side. "reset" and "count" are the
+# (op, threshold) comparisons of a HysteresisCounter moving between "stages" (reset stage, count stage);
+# "alternate" rules use an AlternatingCounter instead, counting every switch between the two stages.
+# "event" names the counted events in event streams ("rep" by default).
+RULES = {
+    "steps": {"compare": ("right_ankle", "left_ankle"), "alternate": True, "label": "Steps",  # steps_tracker_2.py
+              "event": "step"},
+    "arm_steps": {"compare": ("right_wrist", "left_wrist"), "alternate": True, "label": "Steps",  # steps_tracker.py
+                  "event": "step"},
+    "jumping_jacks": {"angle": ("hip", "shoulder", "elbow"), "side": "left", "reset": ("<", 50),
+                      "count": (">", 100), "stages": ("down", "up"), "label": "Count"},
+    "bench_press": {"compare": ("elbow", "shoulder"), "side": "right", "reset": (">", 0), "count": ("<", 0),
+                    "stages": ("down", "up"), "label": "Count"},
+    "squats": {"angle": ("hip", "knee", "ankle"), "side": "right", "reset": (">", 100), "count": ("<", 90),
+               "stages": ("up", "down"), "label": "Count"},
+    "crunches": {"angle": ("knee", "hip", "shoulder"), "side": "left", "reset": (">", 60), "count": ("<", 50),
+                 "stages": ("down", "up"), "label": "Count"},
+    "curls": {"angle": ("shoulder", "elbow", "wrist"), "side": "right", "reset": (">", 150), "count": ("<", 30),
+              "stages": ("down", "up"), "label": "Right"},
+    "left_curls": {"angle": ("shoulder", "elbow", "wrist"), "side": "left", "reset": (">", 150), "count": ("<", 30),
+                   "stages": ("down", "up"), "label": "Left"},
+    "single_curls": {"compare": ("wrist", "elbow"), "side": "right", "reset": (">", 0), "count": ("<", 0),
+                     "stages": ("down", "up"), "initial_stage": "down", "label": "Count"},
+    "side_curls": {"angle": ("hip", "shoulder", "wrist"), "side": "right", "reset": ("<", 70), "count": (">", 80),
+                   "stages": ("down", "up"), "label": "Count"},
+    "pushups": {"angle": ("shoulder", "elbow", "wrist"), "side": "right", "reset": (">", 100), "count": ("<", 80),
+                "stages": ("up", "down"), "label": "Push-ups"},
+    "jumps": {"compare": ("wrist", "heel"), "side": "right", "reset": (">=", 0), "count": ("<", 0),
+              "stages": ("grounded", "jump"), "label": "Jumps", "event": "jump"},
+}
+
+# Exercises: the rules counted together on every frame
+EXERCISES = {
+    "steps": ("steps",),
+    "arm_steps": ("arm_steps",),
+    "jumping_jacks": ("jumping_jacks",),
+    "bench_press": ("bench_press",),
+    "squats": ("squats",),
+    "crunches": ("crunches",),
+    "curls": ("curls", "left_curls"),
+    "single_curls": ("single_curls",),
+    "side_curls": ("side_curls",),
+    "pushups": ("pushups", "jumps"),
+}
+
+
+def landmark_id(name, side=None):
+    """ Resolves a landmark name (or ID) to its ID, prefixing the rule's side to names without one. """
+    if isinstance(name, int):
+        return name
+    if name not in LANDMARK_IDS and side:
+        name = f"{side}_{name}"
+    if name not in LANDMARK_IDS:
+        raise ValueError(f"Unknown landmark '{name}'")
+    return LANDMARK_IDS[name]
+
+
+def compile_counter(rule):
+    """ Builds the counter of a rule. """
+    if rule.get("alternate"):
+        first, second = rule.get("stages", ("right_up", "left_up"))
+        return AlternatingCounter(rule.get("reset", ("<", 0)), rule.get("count", (">", 0)), first, second,
+                                  initial_stage=rule.get("initial_stage"))
+    reset_stage, count_stage = rule["stages"]
+    return HysteresisCounter(rule["reset"], rule["count"], reset_stage, count_stage,
+                             initial_stage=rule.get("initial_stage"))
+
+
+class RuleEngine:
+    """
+    Evaluates a set of counting rules on landmark arrays.
+
+    The rules are compiled once into index arrays, so the signals of every rule are computed together: all the
+    joint angles in one joint_angles call and all the landmark comparisons in one fancy-indexing subtraction,
+    whether for a single frame or a whole (T, 33, 4) session.
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules: Sequence of rule names from RULES or rule dictionaries.
+        """
+        self.names = [rule if isinstance(rule, str) else rule.get("name", f"rule_{i}") for i, rule in enumerate(rules)]
+        self.rules = [RULES[rule] if isinstance(rule, str) else rule for rule in rules]
+        self.counters = [compile_counter(rule) for rule in self.rules]
+
+        # Splitting the rules into angle and comparison columns of the signal array
+        triples, pairs, self.angle_columns, self.compare_columns = [], [], [], []
+        for column, rule in enumerate(self.rules):
+            side = rule.get("side")
+            if "angle" in rule:
+                triples.append([landmark_id(name, side) for name in rule["angle"]])
+                self.angle_columns.append(column)
+            else:
+                pairs.append([landmark_id(name, side) for name in rule["compare"]])
+                self.compare_columns.append(column)
+        self.triples = np.asarray(triples, dtype=np.intp).reshape(-1, 3)
+        self.pairs = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+
+        self.reset()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def reset(self):
+        self.stages = [counter.initial_stage for counter in self.counters]
+        self.counts = [0] * len(self.counters)
+        self.values = np.full(len(self.rules), np.nan)
+
+    def signals(self, landmarks):
+        """
+        Computes the signal of every rule.
+
+        Args:
+            landmarks: Pixel-space landmark array of shape (..., 33, 4).
+
+        Returns:
+            Array of shape (..., len(rules)), one column per rule, NaN for frames without a pose.
+        """
+        # Truncating to whole pixels first, as get_positions does for the scripts' counters
+        points = np.trunc(np.asarray(landmarks)[..., :2])
+        values = np.empty(points.shape[:-2] + (len(self.rules),))
+        if self.angle_columns:
+            values[..., self.angle_columns] = joint_angles(points, self.triples)
+        if self.compare_columns:
+            values[..., self.compare_columns] = points[..., self.pairs[:, 0], 1] - points[..., self.pairs[:, 1], 1]
+
+        # Keeping whole frames without a pose NaN, comparison columns included
+        values[np.isnan(points[..., 0, 0])] = np.nan
+        return values
+
+    def update(self, landmarks):
+        """
+        Steps every rule's counter with one frame. Frames without a pose (None) leave the counters unchanged.
+
+        Returns:
+            Array with the signal of every rule for the frame, NaN without a pose.
+        """
+        if landmarks is None:
+            self.values = np.full(len(self.rules), np.nan)
+            return self.values
+        self.values = self.signals(landmarks)
+        for i, (counter, value) in enumerate(zip(self.counters, self.values.tolist())):
+            self.stages[i], self.counts[i] = counter.step(value, self.stages[i], self.counts[i])
+        return self.values
+
+    def count_session(self, landmarks):
+        """
+        Counts every rule over a whole session at once, without stepping frame by frame.
+
+        Args:
+            landmarks: Pixel-space (T, 33, 4) landmark array, NaN for frames without a pose.
+
+        Returns:
+            Dictionary mapping each rule name to its counter's run_batch() result plus its signal ('values').
+        """
+        values = self.signals(landmarks)
+        results = {}
+        for i, (name, counter) in enumerate(zip(self.names, self.counters)):
+            results[name] = counter.run_batch(values[:, i], counter.initial_stage)
+            results[name]["values"] = values[:, i]
+        return results
+
+    def summary(self):
+        """ Dictionary mapping each rule name to its count. """
+        return dict(zip(self.names, self.counts))
+
+    def emit_events(self, events, frame_index, previous_counts, track_id=None):
+        """ Writes an event to an EventStream for every rule whose count went up since previous_counts. """
+        for i, (rule, before, count) in enumerate(zip(self.rules, previous_counts, self.counts)):
+            if count == before:
+                continue
+            signal = "angle" if "angle" in rule else "value"
+            events.emit(rule.get("event", "rep"), frame_index, track_id, rule=self.names[i], count=count,
+                        stage=self.stages[i], **{signal: round(float(self.values[i]), 2)})
+
+    def draw(self, hud, landmarks=None, font_scale=1.25):
+        """
+        Queues the count of every rule on a HUD, plus the angle next to its joint for angle rules.
+
+        The count is drawn green in a rule's count stage and red otherwise, like the exercise scripts.
+        """
+        for i, (rule, counter) in enumerate(zip(self.rules, self.counters)):
+            if rule.get("alternate"):
+                color = (255, 255, 255)
+            else:
+                color = (0, 255, 0) if self.stages[i] == counter.count_stage else (0, 0, 255)
+            hud.add_text(f"{rule.get('label', self.names[i])}: {self.counts[i]}", (0, 50 + 60 * i),
+                         font_scale=font_scale, thickness=2, bg_color=color)
+
+        if landmarks is None:
+            return
+        for column, (_, b, _) in zip(self.angle_columns, self.triples.tolist()):
+            if np.isnan(self.values[column]):
+                continue
+            x, y = (int(v) for v in landmarks[b, :2])
+            hud.add_text(f"{int(self.values[column])} deg", (x + 10, y), font_scale=0.6, thickness=1,
+                         bg_color=(255, 255, 255), text_color=(0, 0, 0))
+
+
+def run_exercise(exercise, video_path, output_path=None, display=True, resizing_factor=0.45, detector_kwargs=None,
+                 events_path=None, summary_interval=10.0, detector=None):
+    """
+    Counts an exercise on a video with a single frame loop shared by every exercise.
+
+    Without output_path and display the run is headless: nothing is drawn, shown or encoded.
+
+    Args:
+        exercise: Name of the exercise in EXERCISES, or a sequence of rule names/dictionaries.
+        video_path: Path of the input video.
+        output_path: Optional path of the annotated output video.
+        display: Whether to show the annotated frames in a window.
+        resizing_factor: Scale of the displayed frames.
+        detector_kwargs: Keyword arguments for PoseDetector.
+        events_path: Optional path ('-' for stdout) of a JSONL stream of rep/step/jump events and summaries.
+        summary_interval: Seconds of video between two summaries in the event stream.
+        detector: Optional PoseDetector already loaded, used instead of building one from detector_kwargs.
+
+    Returns:
+        Dictionary mapping each rule to its count.
+    """
+    import cv2 as cv
+    from events import EventStream
+    from Pose_estimationModule import PoseDetector
+    from utils import HUD
+    from video_io import create_video_writer, open_video_source
+
+    engine = RuleEngine(EXERCISES[exercise] if isinstance(exercise, str) else exercise)
+    detector = detector or PoseDetector(**(detector_kwargs or {}))
+    hud = HUD()
+
+    cap = open_video_source(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Couldn't open {video_path}")
+    w, h, fps = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT, cv.CAP_PROP_FPS))
+    out = create_video_writer(output_path, fps, (w, h)) if output_path else None
+    events = EventStream(events_path, fps, summary_interval) if events_path else None
+
+    frame_index = 0
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        detector.find_pose(frame, draw=out is not None or display)
+        landmarks = detector.get_landmark_array(frame)
+        previous_counts = list(engine.counts)
+        engine.update(landmarks)
+        frame_index += 1
+
+        if events is not None:
+            engine.emit_events(events, frame_index - 1, previous_counts)
+            events.maybe_summary(frame_index, engine.summary())
+        if out is None and not display:
+            continue
+        engine.draw(hud, landmarks)
+        hud.render(frame)
+        if out is not None:
+            out.write(frame)
+        if display:
+            cv.imshow("Video", cv.resize(frame, (0, 0), fx=resizing_factor, fy=resizing_factor))
+            if cv.waitKey(1) & 0xFF == ord('p'):
+                break
+
+    cap.release()
+    if out is not None:
+        out.release()
+    detector.close()
+    if display:
+        cv.destroyAllWindows()
+    if events is not None:
+        events.close(frame_index, engine.summary())
+    return engine.summary()
+
+
+def main(argv=None, detector=None):
+    """ Command-line interface; main.py calls it with a PoseDetector it already loaded. """
+    parser = argparse.ArgumentParser(description="Count an exercise on a video.")
+    parser.add_argument("exercise", choices=sorted(EXERCISES))
+    parser.add_argument("video_path")
+    parser.add_argument("--output", default=None, help="Optional path of the annotated output video")
+    parser.add_argument("--no-display", action="store_true", help="Don't show the frames while counting")
+    parser.add_argument("--events", default=None, help="Write JSONL rep events and summaries to this file ('-' for "
+                                                       "stdout); without --output and with --no-display nothing is "
+                                                       "rendered or encoded")
+    parser.add_argument("--summary-interval", type=float, default=10.0, help="Seconds of video between summaries")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    counts = run_exercise(args.exercise, args.video_path, args.output, display=not args.no_display,
+                          events_path=args.events, summary_interval=args.summary_interval, detector=detector)
+    print(", ".join(f"{name}: {count}" for name, count in counts.items()),
+          f"({time.perf_counter() - start:.2f}s)", file=sys.stderr if args.events == "-" else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from exercises import EXERCISES, RuleEngine
+
+NUM_LANDMARKS = 33
+
+
+def _aligned(offset, alignment=64):
+    return -(-offset // alignment) * alignment
+
+
+class FrameRing:
+    """
+    Ring of fixed-size frame slots in shared memory, with a parallel ring of landmark results.
+
+    Frames never go through a pipe: the decoder copies each frame into a free slot once, workers run inference on
+    a NumPy view of the slot, and write the (33, 4) normalized landmarks (NaN without a pose) into the same slot of
+    the results ring. Only slot numbers travel through three queues, which also do the signalling:
+      - free: slots the decoder may fill (blocking on it is the backpressure),
+      - filled: slots holding a frame to process, None telling a worker to stop,
+      - done: slots holding results, None telling the consumer a worker stopped.
+    Each slot also stores the sequence number of its frame, so results can be put back in order.
+
+    The ring is passed to spawned processes as an argument; they attach to the same shared memory block.
+    """
+
+    def __init__(self, slots, frame_shape, context=None):
+        """
+        Args:
+            slots: Number of slots, i.e. of frames in flight between the decoder and the consumer.
+            frame_shape: (height, width, channels) of the frames.
+            context: multiprocessing context the queues are created with, spawn by default.
+        """
+        context = context or mp.get_context("spawn")
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        self.block = shared_memory.SharedMemory(create=True, size=self._layout()[-1])
+        self.owner = True
+        self.free, self.filled, self.done = context.Queue(), context.Queue(), context.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self._map()
+
+    def _layout(self):
+        # Byte offsets of the sequence numbers, the frames and the results, and the total size
+        frames_offset = _aligned(8 * self.slots)
+        results_offset = _aligned(frames_offset + self.slots * int(np.prod(self.frame_shape)))
+        return 0, frames_offset, results_offset, results_offset + self.slots * NUM_LANDMARKS * 4 * 4
+
+    def _map(self):
+        sequences_offset, frames_offset, results_offset, _ = self._layout()
+        buffer = self.block.buf
+        self.sequences = np.ndarray((self.slots,), dtype=np.int64, buffer=buffer, offset=sequences_offset)
+        self.frames = np.ndarray((self.slots,) + self.frame_shape, dtype=np.uint8, buffer=buffer, offset=frames_offset)
+        self.results = np.ndarray((self.slots, NUM_LANDMARKS, 4), dtype=np.float32, buffer=buffer,
+                                  offset=results_offset)
+
+    def __getstate__(self):
+        return {"name": self.block.name, "slots": self.slots, "frame_shape": self.frame_shape,
+                "queues": (self.free, self.filled, self.done)}
+
+    def __setstate__(self, state):
+        self.slots, self.frame_shape = state["slots"], state["frame_shape"]
+        self.free, self.filled, self.done = state["queues"]
+        # Spawned processes share their parent's resource tracker, so attaching normally doesn't make them unlink
+        # the block at exit; the creating process unlinks it in close()
+        self.block = shared_memory.SharedMemory(name=state["name"])
+        self.owner = False
+        self._map()
+
+    # Decoder side
+    def acquire(self, timeout=None):
+        """ Waits for a free slot and returns it; write the frame into self.frames[slot]. """
+        return self.free.get(timeout=timeout)
+
+    def publish(self, slot, sequence):
+        self.sequences[slot] = sequence
+        self.filled.put(slot)
+
+    def finish(self, workers):
+        """ Tells every worker there are no more frames. """
+        for _ in range(workers):
+            self.filled.put(None)
+
+    # Worker side
+    def take(self):
+        """ Waits for a filled slot. Returns it, or None once the decoder finished. """
+        return self.filled.get()
+
+    def complete(self, slot):
+        """ Hands a slot whose results were written to the consumer, None when the worker stops. """
+        self.done.put(slot)
+
+    # Consumer side
+    def collect(self, timeout=None):
+        """ Waits for a slot with results. Returns it, or None when a worker stopped. """
+        return self.done.get(timeout=timeout)
+
+    def release(self, slot):
+        """ Gives a slot back to the decoder once its results were read. """
+        self.free.put(slot)
+
+    def close(self):
+        # The views must go before the block can be closed; the creating process also frees the memory
+        self.sequences = self.frames = self.results = None
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+
+def _decoder(ring, video_path, workers, max_side):
+    """ Decoder process: fills free slots with the video's frames, in order. """
+    from video_io import open_video_source
+
+    cap = open_video_source(video_path, max_side=max_side, reuse_buffer=True)
+    try:
+        sequence = 0
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            slot = ring.acquire()
+            ring.frames[slot] = frame
+            ring.publish(slot, sequence)
+            sequence += 1
+    finally:
+        cap.release()
+        ring.finish(workers)
+        ring.close()
+
+
+def _pose_worker(ring, detector_kwargs):
+    """ Worker process: runs a PoseDetector on the filled slots and writes the landmarks into the results ring. """
+    from Pose_estimationModule import PoseDetector
+
+    detector = None
+    try:
+        detector = PoseDetector(**detector_kwargs)
+        while True:
+            slot = ring.take()
+            if slot is None:
+                break
+            # Inference reads the frame straight from shared memory
+            detector.find_pose(ring.frames[slot], draw=False)
+            landmarks = detector.get_normalized_landmarks()
+            ring.results[slot] = np.nan if landmarks is None else landmarks
+            ring.complete(slot)
+    finally:
+        if detector is not None:
+            detector.close()
+        ring.complete(None)
+        ring.close()
+
+
+def ring_landmarks(video_path, workers=1, slots=None, detector_kwargs=None, max_side=None):
+    """
+    Runs decoding and pose detection in separate processes connected by a FrameRing, and yields the landmarks.
+
+    With several workers, frames are spread over them as they free up, so each detector only sees part of the
+    video. Use one worker when landmark smoothing and tracking matter, or pass mode=True in detector_kwargs so
+    every frame is detected on its own.
+
+    Args:
+        video_path: Path of the input video.
+        workers: Number of PoseDetector worker processes.
+        slots: Number of frames in flight, twice the number of workers plus two by default.
+        detector_kwargs: Keyword arguments for PoseDetector.
+        max_side: Optional longest side the frames are decoded to.
+
+    Yields:
+        (frame index, landmarks) in frame order, landmarks being a (33, 4) pixel-space array or None without a pose.
+    """
+    import cv2 as cv
+    from video_io import open_video_source
+
+    cap = open_video_source(video_path, max_side=max_side)
+    if not cap.isOpened():
+        raise RuntimeError(f"Couldn't open {video_path}")
+    w, h = int(cap.get(cv.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    context = mp.get_context("spawn")
+    ring = FrameRing(slots or 2 * workers + 2, (h, w, 3), context)
+    processes = [context.Process(target=_decoder, args=(ring, video_path, workers, max_side), daemon=True,
+                                 name="frame-ring-decoder")]
+    processes += [context.Process(target=_pose_worker, args=(ring, detector_kwargs or {}), daemon=True,
+                                  name=f"frame-ring-worker-{worker}") for worker in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        # Reordering results, which workers finish out of order, by sequence number
+        scale = np.array((w, h, w, 1), dtype=np.float32)
+        pending = {}
+        next_sequence = 0
+        running = workers
+        while running:
+            try:
+                slot = ring.collect(timeout=1.0)
+            except queue.Empty:
+                # Slots held by a crashed process never come back, so waiting longer would hang
+                if any(process.exitcode not in (None, 0) for process in processes):
+                    raise RuntimeError("A decoder or pose worker process died") from None
+                continue
+            if slot is None:
+                running -= 1
+                continue
+            pending[int(ring.sequences[slot])] = ring.results[slot] * scale
+            ring.release(slot)
+            while next_sequence in pending:
+                landmarks = pending.pop(next_sequence)
+                yield next_sequence, None if np.isnan(landmarks[0, 0]) else landmarks
+                next_sequence += 1
+
+        # The decoder and workers always send their end markers, even when they fail, so a clean end of the loop
+        # doesn't mean the whole video went through: their exit codes tell
+        for process in processes:
+            process.join(timeout=10)
+        failed = [f"{process.name} (exit code {process.exitcode})" for process in processes if process.exitcode != 0]
+        if failed or pending:
+            raise RuntimeError(f"{video_path} was only processed up to frame {next_sequence}: " +
+                               (", ".join(failed) + " failed" if failed else "results are missing"))
+    finally:
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count an exercise with decoding and pose detection in separate "
+                                                 "processes sharing frames through a shared memory ring.")
+    parser.add_argument("video_path")
+    parser.add_argument("exercise", choices=sorted(EXERCISES))
+    parser.add_argument("--workers", type=int, default=1, help="PoseDetector worker processes")
+    parser.add_argument("--slots", type=int, default=None, help="Frames in flight (default: 2 * workers + 2)")
+    parser.add_argument("--max-side", type=int, default=None, help="Decode frames to this longest side")
+    args = parser.parse_args()
+
+    engine = RuleEngine(EXERCISES[args.exercise])
+    start = time.perf_counter()
+    frames = 0
+    for frame_index, landmarks in ring_landmarks(args.video_path, args.workers, args.slots, max_side=args.max_side):
+        engine.update(landmarks)
+        frames = frame_index + 1
+    elapsed = time.perf_counter() - start
+    print(", ".join(f"{name}: {count}" for name, count in engine.summary().items()),
+          f"({frames} frames, {frames / elapsed:.1f} fps)")
+
+
+if __name__ == "__main__":
+    main()
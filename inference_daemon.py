@@ -0,0 +1,392 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from metrics import timed
+
+NUM_LANDMARKS = 33
+
+# Every message is a JSON header followed by an optional binary payload (frames, or landmark results), each
+# prefixed by its length: (header length, payload length) as two unsigned 32-bit big-endian integers
+_LENGTHS = struct.Struct("!II")
+
+
+def default_socket_path():
+    """ Socket of the daemon: $POSE_DAEMON_SOCKET, else pose-inference.sock in the temporary directory. """
+    return os.environ.get("POSE_DAEMON_SOCKET") or os.path.join(tempfile.gettempdir(), "pose-inference.sock")
+
+
+def _send(sock, message, payload=None):
+    header = json.dumps(message).encode()
+    payload = memoryview(payload).cast("B") if payload is not None else b""
+    sock.sendall(_LENGTHS.pack(len(header), len(payload)) + header)
+    if len(payload):
+        sock.sendall(payload)
+
+
+def _receive_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("Connection closed in the middle of a message")
+        received += n
+    return buffer
+
+
+def _receive(sock):
+    """ Receives one message. Returns (header, payload), or (None, None) when the peer closed the connection. """
+    lengths = sock.recv(_LENGTHS.size, socket.MSG_WAITALL)
+    if not lengths:
+        return None, None
+    if len(lengths) < _LENGTHS.size:
+        lengths += _receive_exactly(sock, _LENGTHS.size - len(lengths))
+    header_length, payload_length = _LENGTHS.unpack(lengths)
+    header = json.loads(_receive_exactly(sock, header_length))
+    return header, _receive_exactly(sock, payload_length) if payload_length else None
+
+
+def attach_shared_memory(name):
+    """ Opens a shared memory block created by another process without taking over its cleanup. """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        # Older versions register every attached block and unlink it when this process exits
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """ One client connection: a session that borrows a warm detector for as long as it stays connected. """
+
+    def setup(self):
+        self.detector = None
+        self.blocks = {}  # Shared memory blocks of the client, by name
+
+    def handle(self):
+        daemon = self.server.inference_daemon
+        while True:
+            try:
+                message, payload = _receive(self.request)
+            except (ConnectionError, OSError):
+                return
+            if message is None:
+                return
+            try:
+                reply, results = self.dispatch(daemon, message, payload)
+            except Exception as error:
+                reply, results = {"ok": False, "error": repr(error)}, None
+            _send(self.request, reply, results)
+
+    def dispatch(self, daemon, message, payload):
+        op = message["op"]
+        if op == "status":
+            return dict(daemon.status(), ok=True), None
+        if op == "open":
+            if self.detector is None:
+                self.detector = daemon.acquire()
+            return {"ok": True, "settings": self.detector.cache_settings(),
+                    "connections": sorted(self.detector.mpPose.POSE_CONNECTIONS)}, None
+        if self.detector is None:
+            raise RuntimeError("Send 'open' before processing frames")
+        if op == "reset":
+            self.detector.reset()
+            return {"ok": True}, None
+        if op == "process":
+            shape, dtype = tuple(message["shape"]), np.dtype(message.get("dtype", "uint8"))
+            if "shm" in message:
+                # Reading the frames where the client wrote them, without copying them through the socket
+                block = self.blocks.get(message["shm"])
+                if block is None:
+                    block = self.blocks[message["shm"]] = attach_shared_memory(message["shm"])
+                frames = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            else:
+                frames = np.frombuffer(payload, dtype=dtype).reshape(shape)
+            start = time.perf_counter()
+            results = daemon.process(self.detector, frames)
+            return {"ok": True, "count": len(results), "inference_s": time.perf_counter() - start}, results
+        raise ValueError(f"Unknown op '{op}'")
+
+    def finish(self):
+        for block in self.blocks.values():
+            block.close()
+        if self.detector is not None:
+            self.server.inference_daemon.release(self.detector)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class InferenceDaemon:
+    """
+    Long-running local process keeping a pool of warm PoseDetectors, served over a Unix domain socket.
+
+    Every client connection is one session (typically one clip): it borrows a detector from the pool when it
+    sends 'open', gets it reset and back into the pool when it disconnects, and in between sends frames or frame
+    batches, either in the message payload or, for large frames, in a shared memory block named in the message.
+    Replies carry normalized (N, 33, 4) landmark arrays, NaN for frames without a pose. Clients use
+    RemotePoseDetector, so a short job pays for inference only, not for loading the model.
+    """
+
+    def __init__(self, socket_path=None, detectors=2, detector_kwargs=None, acquire_timeout=30.0):
+        """
+        Args:
+            socket_path: Path of the Unix socket, default_socket_path() by default.
+            detectors: Number of warm PoseDetectors, i.e. of clients served at the same time.
+            detector_kwargs: Keyword arguments for PoseDetector.
+            acquire_timeout: Seconds a new client waits for a free detector before getting an error.
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.detector_count = detectors
+        self.detector_kwargs = detector_kwargs or {}
+        self.acquire_timeout = acquire_timeout
+        self.frames = 0
+        self.sessions = 0
+        self._idle = queue.Queue()
+        self._server = None
+
+    def start(self):
+        """ Loads the detectors and binds the socket, replacing a stale socket file left by a crashed daemon. """
+        from Pose_estimationModule import PoseDetector
+
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+            else:
+                probe.close()
+                raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+
+        for _ in range(self.detector_count):
+            self._idle.put(PoseDetector(**self.detector_kwargs))
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.inference_daemon = self
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """ Stops serve_forever() from another thread. """
+        self._server.shutdown()
+
+    def close(self):
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        while not self._idle.empty():
+            self._idle.get().close()
+
+    def acquire(self):
+        try:
+            detector = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise RuntimeError(f"All {self.detector_count} detectors are busy") from None
+        self.sessions += 1
+        return detector
+
+    def release(self, detector):
+        detector.reset()
+        self._idle.put(detector)
+
+    def process(self, detector, frames):
+        """ Runs a session's detector over a batch of frames, in order. Returns (N, 33, 4) normalized landmarks. """
+        results = np.full((len(frames), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        for index, frame in enumerate(frames):
+            detector.find_pose(frame, draw=False)
+            landmarks = detector.get_normalized_landmarks()
+            if landmarks is not None:
+                results[index] = landmarks
+        self.frames += len(frames)
+        return results
+
+    def status(self):
+        return {"detectors": self.detector_count, "idle": self._idle.qsize(), "sessions": self.sessions,
+                "frames": self.frames}
+
+
+class RemotePoseDetector:
+    """
+    Drop-in replacement for PoseDetector that runs inference in an InferenceDaemon.
+
+    find_pose(), get_landmark_array() and get_positions() behave as PoseDetector's, with the daemon's detector
+    settings. Frames of at least shared_memory_threshold bytes go through a shared memory block instead of the
+    socket. Constructing one does not import MediaPipe.
+
+    Example:
+        detector = RemotePoseDetector()
+        detector.find_pose(frame)
+        positions = detector.get_positions(frame)
+    """
+
+    def __init__(self, socket_path=None, shared_memory_threshold=1 << 20, timeout=None):
+        """
+        Args:
+            socket_path: Path of the daemon's socket, default_socket_path() by default.
+            shared_memory_threshold: Batch size in bytes from which frames are passed in shared memory,
+                                     None to always send them through the socket.
+            timeout: Optional socket timeout in seconds.
+        """
+        from utils import SkeletonRenderer
+
+        self.socket_path = socket_path or default_socket_path()
+        self.shared_memory_threshold = shared_memory_threshold
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.socket_path)
+        self._block = None
+
+        reply = self._request({"op": "open"})[0]
+        self.settings = reply["settings"]
+        self.renderer = SkeletonRenderer(reply["connections"])
+        self.landmark_array = None  # Normalized (33, 4) landmarks of the last frame, None without a pose
+        self.frame_index = 0
+        self.inference_time = 0.0  # Seconds the daemon spent on this client's frames
+        self._landmark_buffers = {}
+
+    def _request(self, message, payload=None):
+        _send(self.sock, message, payload)
+        reply, results = _receive(self.sock)
+        if reply is None:
+            raise ConnectionError("The inference daemon closed the connection")
+        if not reply["ok"]:
+            raise RuntimeError(f"Inference daemon: {reply['error']}")
+        return reply, results
+
+    def _shared_frames(self, shape, dtype):
+        # Shared memory view for a batch, reallocating the block only when a larger batch comes along
+        size = int(np.prod(shape)) * dtype.itemsize
+        if self._block is None or self._block.size < size:
+            if self._block is not None:
+                self._block.close()
+                self._block.unlink()
+            self._block = shared_memory.SharedMemory(create=True, size=size)
+        return np.ndarray(shape, dtype=dtype, buffer=self._block.buf)
+
+    def process(self, frames):
+        """
+        Runs inference on a batch of consecutive frames, shaped (N, H, W, 3) or a list of equally sized frames.
+
+        Returns:
+            A float32 array of shape (N, 33, 4) with normalized (x, y, z, visibility), NaN for frames without a pose.
+        """
+        frames = np.asarray(frames)
+        message = {"op": "process", "shape": frames.shape, "dtype": frames.dtype.str}
+        if self.shared_memory_threshold is not None and frames.nbytes >= self.shared_memory_threshold:
+            self._shared_frames(frames.shape, frames.dtype)[:] = frames
+            message["shm"] = self._block.name
+            reply, results = self._request(message)
+        else:
+            reply, results = self._request(message, np.ascontiguousarray(frames))
+        self.inference_time += reply["inference_s"]
+        self.frame_index += len(frames)
+        results = np.frombuffer(results, dtype=np.float32).reshape(len(frames), NUM_LANDMARKS, 4)
+        last = results[-1] if len(results) else None
+        self.landmark_array = None if last is None or np.isnan(last[0, 0]) else last
+        return results
+
+    @timed("find_pose")
+    def find_pose(self, frame, draw=True, color=None):
+        self.process(frame[np.newaxis])
+        if draw:
+            self.renderer.draw(frame, self.get_landmark_array(frame), color=color)
+        return frame
+
+    def get_landmark_array(self, frame, ids=None):
+        """
+        Returns the last frame's landmarks as (x, y, z, visibility) rows in pixel space, as PoseDetector does.
+
+        Returns:
+            A float32 array of shape (33, 4), or (len(ids), 4) when ids is given, or None if no pose was detected.
+            The array is reused on the next call, so copy it if it has to outlive the current frame.
+        """
+        if self.landmark_array is None:
+            return None
+        key = None if ids is None else tuple(ids)
+        buffer = self._landmark_buffers.get(key)
+        if buffer is None:
+            buffer = self._landmark_buffers[key] = np.zeros((NUM_LANDMARKS if key is None else len(key), 4),
+                                                            dtype=np.float32)
+        buffer[:] = self.landmark_array if key is None else self.landmark_array[list(key)]
+
+        # Converting normalized coordinates to pixel coordinates (z uses the same scale as x)
+        h, w = frame.shape[:2]
+        buffer[:, 0] *= w
+        buffer[:, 1] *= h
+        buffer[:, 2] *= w
+        return buffer
+
+    def get_positions(self, frame):
+        landmarks = {}
+        landmark_array = self.get_landmark_array(frame)
+        if landmark_array is not None:
+            # Truncating pixel coordinates to integers, as PoseDetector does
+            for ID, (cx, cy) in enumerate(landmark_array[:, :2].astype(np.int32).tolist()):
+                landmarks[ID] = (cx, cy)
+        return landmarks
+
+    def reset(self):
+        """ Starts a new video on the same warm detector. """
+        self._request({"op": "reset"})
+        self.landmark_array = None
+        self.frame_index = 0
+
+    def status(self):
+        return self._request({"op": "status"})[0]
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self._block is not None:
+            self._block.close()
+            self._block.unlink()
+            self._block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve warm PoseDetectors to local clients over a Unix socket.")
+    parser.add_argument("--socket", default=None, help=f"Socket path (default: {default_socket_path()})")
+    parser.add_argument("--detectors", type=int, default=2, help="Warm detectors, i.e. clients served at once")
+    parser.add_argument("--complexity", type=int, default=1, help="MediaPipe model complexity (0, 1 or 2)")
+    parser.add_argument("--max-side", type=int, default=None, help="Downscale frames to this longest side for inference")
+    args = parser.parse_args()
+
+    daemon = InferenceDaemon(args.socket, args.detectors, {"complexity": args.complexity, "max_side": args.max_side})
+    start = time.perf_counter()
+    daemon.start()
+    print(f"Serving {args.detectors} detectors on {daemon.socket_path} (loaded in {time.perf_counter() - start:.2f}s)")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
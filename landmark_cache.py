@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Bumped whenever the cached array layout changes, so old cache files are never misread
+CACHE_VERSION = 1
+
+
+def video_content_hash(video_path, chunk_size=1 << 20):
+    """ Hashes the bytes of a video file, so renamed or copied files share their cache entry. """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(video_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(video_path, settings):
+    """ Cache key covering the video content and every detector setting that changes the landmarks. """
+    payload = json.dumps({"video": video_content_hash(video_path), "settings": settings, "version": CACHE_VERSION},
+                         sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ArrayPoseResults:
+    """ Stand-in for MediaPipe's pose results, built from a normalized landmark array (cached or propagated). """
+
+    def __init__(self, landmark_array):
+        self.landmark_array = landmark_array  # (33, 4) normalized (x, y, z, visibility), or None without a pose
+        self._pose_landmarks = None
+
+    @property
+    def pose_landmarks(self):
+        # Building the protobuf landmark list only when something (e.g. drawing) asks for it
+        if self.landmark_array is None:
+            return None
+        if self._pose_landmarks is None:
+            from mediapipe.framework.formats import landmark_pb2
+            self._pose_landmarks = landmark_pb2.NormalizedLandmarkList(landmark=[
+                landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=visibility)
+                for x, y, z, visibility in self.landmark_array.tolist()
+            ])
+        return self._pose_landmarks
+
+
+class LandmarkCache:
+    """
+    On-disk cache of per-frame normalized landmarks for one video and one set of detector settings.
+
+    Entries are stored as a (T, 33, 4) float32 .npy file, with NaN rows for frames without a pose, and are read
+    back memory-mapped so only the frames that are actually used get paged in.
+    """
+
+    def __init__(self, cache_dir, video_path, settings, expected_frames=None):
+        """
+        Args:
+            cache_dir: Directory holding the cache files.
+            video_path: Path of the video the landmarks belong to.
+            settings: Dictionary of detector settings that affect the landmarks.
+            expected_frames: Number of frames in the video. A new entry is only saved if at least that many frames
+                             were written, which catches decoding that stopped early on a corrupt frame.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, cache_key(video_path, settings) + ".npy")
+        self.expected_frames = expected_frames
+        self._rows = []
+
+        # Reading an existing entry memory-mapped, otherwise collecting rows to write on close
+        self.landmarks = np.load(self.path, mmap_mode="r") if os.path.exists(self.path) else None
+
+    @property
+    def readonly(self):
+        return self.landmarks is not None
+
+    def __len__(self):
+        return len(self.landmarks) if self.readonly else len(self._rows)
+
+    def read(self, index):
+        """ Returns the normalized (33, 4) landmarks of a frame, or None if no pose was detected in it. """
+        row = self.landmarks[index]
+        return None if np.isnan(row[0, 0]) else row
+
+    def write(self, landmark_array):
+        """ Appends the normalized (33, 4) landmarks of the next frame, or None if no pose was detected. """
+        if landmark_array is None:
+            landmark_array = np.full((33, 4), np.nan, dtype=np.float32)
+        self._rows.append(np.asarray(landmark_array, dtype=np.float32))
+
+    def close(self, complete=False):
+        """
+        Saves a newly written entry, then reopens it for reading.
+
+        Args:
+            complete: Whether the video was read to its end. Without it the rows are discarded, so interrupted
+                      runs never leave a truncated entry that later runs would take for a full one.
+        """
+        if self.readonly or not self._rows:
+            return
+        if not complete or (self.expected_frames and len(self._rows) < self.expected_frames):
+            self._rows = []
+            return
+
+        # Writing to a temporary file first so a crash never leaves a half-written entry
+        temporary_path = self.path + ".tmp.npy"
+        np.save(temporary_path, np.stack(self._rows))
+        os.replace(temporary_path, self.path)
+        self._rows = []
+        self.landmarks = np.load(self.path, mmap_mode="r")
@@ -0,0 +1,99 @@
+import argparse
+import importlib
+import json
+import os
+import runpy
+import sys
+import time
+
+_STARTED = time.perf_counter()
+
+# Multi-person trackers, run as scripts from their folder: (folder, script, backends, models)
+MULTI_PERSON = {
+    "multi_steps": ("8. Tracking Steps for multiple persons", "steps_tracker.py", ("cv2", "mediapipe", "ultralytics"),
+                    ("yolov8n",)),
+    "jump_rope": ("9. Jump Rope Workout (multiple person)", "jump_rope_workout_tracker.py", ("cv2", "ultralytics"),
+                  ("yolov8n",)),
+}
+
+# Backends of the single-person exercises, all counted by exercises.run_exercise
+SINGLE_PERSON_BACKENDS = ("cv2", "mediapipe")
+
+
+def _timed(report, section, name, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    report[section][name] = time.perf_counter() - start
+    return result
+
+
+def print_startup(report, file=sys.stderr):
+    """ Prints the startup breakdown, slowest step first within each section. """
+    for section in ("imports", "models"):
+        steps = sorted(report[section].items(), key=lambda item: -item[1])
+        print(f"startup {section}: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in steps), file=file)
+    print(f"startup total: {report['total_s']:.3f}s", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count an exercise, importing only the backends it needs and reporting the startup time.",
+        epilog="Arguments after the exercise go to its script, e.g. 'main.py squats video.mp4 --no-display' or "
+               "'main.py jump_rope --events -'.")
+    parser.add_argument("exercise", help="A single-person exercise of exercises.py, or one of " +
+                                         ", ".join(sorted(MULTI_PERSON)))
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments of the exercise's script")
+    parser.add_argument("--startup-json", default=None, help="Write the startup breakdown to this JSON file")
+    parser.add_argument("--startup-only", action="store_true",
+                        help="Exit once the backends and models are loaded, e.g. to measure cold starts")
+    parser.add_argument("--quiet", action="store_true", help="Don't print the startup breakdown")
+    args = parser.parse_args()
+    startup_json = os.path.abspath(args.startup_json) if args.startup_json else None
+
+    report = {"exercise": args.exercise, "imports": {}, "models": {}}
+    exercises = _timed(report, "imports", "exercises", importlib.import_module, "exercises")
+    multi_person = MULTI_PERSON.get(args.exercise)
+    if multi_person is None and args.exercise not in exercises.EXERCISES:
+        parser.error(f"unknown exercise '{args.exercise}', expected one of "
+                     f"{sorted(exercises.EXERCISES) + sorted(MULTI_PERSON)}")
+
+    # Importing the exercise's backends, and nothing else
+    backends = multi_person[2] if multi_person else SINGLE_PERSON_BACKENDS
+    for backend in backends:
+        _timed(report, "imports", backend, importlib.import_module, backend)
+
+    # Loading the models up front so their load time is reported; the scripts then reuse them
+    detector = None
+    if multi_person:
+        import models
+
+        # The scripts read their videos (and legacy YOLO_WEIGHTS folders) relative to their own folder
+        root = os.path.dirname(os.path.abspath(__file__))
+        folder = os.path.join(root, multi_person[0])
+        os.chdir(folder)
+        sys.path[:0] = [folder, root]
+        for name in multi_person[3]:
+            models.load_yolo(name)
+            report["models"][name] = models.load_times[name]
+    else:
+        from Pose_estimationModule import PoseDetector
+        detector = _timed(report, "models", "pose", PoseDetector)
+
+    report["total_s"] = time.perf_counter() - _STARTED
+    if not args.quiet:
+        print_startup(report)
+    if startup_json:
+        with open(startup_json, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.startup_only:
+        return
+
+    if multi_person:
+        sys.argv = [multi_person[1]] + args.args
+        runpy.run_path(multi_person[1], run_name="__main__")
+    else:
+        exercises.main([args.exercise] + args.args, detector=detector)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import json
+import time
+
+import cv2 as cv
+import numpy as np
+
+from Pose_estimationModule import PoseDetector
+
+
+def measure_inference_scale(video_path, scales=(1.0, 0.75, 0.5, 0.33), max_frames=300, complexity=1):
+    """
+    Measures the speed/accuracy trade-off of PoseDetector's inference_scale on a video.
+
+    One detector per scale processes the same frames in lockstep. The full-resolution (scale 1) landmarks are the
+    reference; the error of the other scales is the pixel distance of their landmarks, in original-frame pixels,
+    over the landmarks the reference sees with visibility >= 0.5.
+
+    Returns:
+        List of dictionaries with scale, ms_per_frame, detection_rate, mean_error_px and p95_error_px.
+    """
+    scales = sorted(set(scales) | {1.0}, reverse=True)
+    detectors = {scale: PoseDetector(complexity=complexity, inference_scale=scale) for scale in scales}
+    timings = {scale: 0.0 for scale in scales}
+    detections = {scale: 0 for scale in scales}
+    errors = {scale: [] for scale in scales}
+
+    cap = cv.VideoCapture(video_path)
+    frames = 0
+    while frames < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames += 1
+
+        landmarks = {}
+        for scale, detector in detectors.items():
+            start = time.perf_counter()
+            detector.find_pose(frame, draw=False)
+            landmark_array = detector.get_landmark_array(frame)
+            timings[scale] += time.perf_counter() - start
+            if landmark_array is not None:
+                detections[scale] += 1
+                landmarks[scale] = landmark_array.copy()
+
+        reference = landmarks.get(1.0)
+        if reference is None:
+            continue
+        visible = reference[:, 3] >= 0.5
+        for scale, landmark_array in landmarks.items():
+            errors[scale].extend(np.linalg.norm(landmark_array[visible, :2] - reference[visible, :2], axis=1))
+    cap.release()
+
+    report = []
+    for scale in scales:
+        scale_errors = np.asarray(errors[scale]) if errors[scale] else np.zeros(1)
+        report.append({
+            "scale": scale,
+            "ms_per_frame": 1000 * timings[scale] / max(frames, 1),
+            "detection_rate": detections[scale] / max(frames, 1),
+            "mean_error_px": float(scale_errors.mean()),
+            "p95_error_px": float(np.percentile(scale_errors, 95)),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure PoseDetector's inference_scale speed/accuracy trade-off.")
+    parser.add_argument("video_path")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.33])
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--json", help="Optional path to write the report as JSON")
+    args = parser.parse_args()
+
+    report = measure_inference_scale(args.video_path, args.scales, args.max_frames)
+    print(f"{'scale':>6} {'ms/frame':>9} {'detected':>9} {'mean px':>8} {'p95 px':>7}")
+    for row in report:
+        print(f"{row['scale']:>6.2f} {row['ms_per_frame']:>9.1f} {row['detection_rate']:>9.0%} "
+              f"{row['mean_error_px']:>8.1f} {row['p95_error_px']:>7.1f}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
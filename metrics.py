@@ -0,0 +1,256 @@
+import atexit
+import bisect
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets in seconds, 0.1 ms to ~26 s in steps of 2^(1/4)
+BUCKETS = tuple(0.0001 * 2 ** (i / 4) for i in range(73))
+
+
+class _NullTimer:
+    """ Timer handed out while instrumentation is disabled: entering and leaving it does nothing. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """ Fixed-bucket latency histogram: constant memory, percentiles estimated from the buckets. """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last bucket counts values above BUCKETS[-1]
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q):
+        """ Estimates the q-th percentile (0-100) by interpolating inside the bucket holding it. """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "mean_ms": 1000 * self.sum / self.count if self.count else 0.0,
+                "p50_ms": 1000 * self.percentile(50), "p95_ms": 1000 * self.percentile(95),
+                "p99_ms": 1000 * self.percentile(99), "max_ms": 1000 * self.max}
+
+
+class Metrics:
+    """
+    Opt-in hot-path instrumentation: per-stage latency histograms, event counters (e.g. dropped frames) and
+    gauges (e.g. queue depths), exported periodically as JSON and Prometheus text format.
+
+    While disabled, timer() returns a shared no-op context manager and count()/gauge() return immediately, so
+    instrumented code pays one attribute check per call.
+
+    Example:
+        metrics.enable(json_path="metrics.json", prometheus_path="metrics.prom")
+        with metrics.timer("model_track"):
+            results = model.track(frame, persist=True)
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.json_path = self.prometheus_path = None
+        self.interval = 10.0
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._exporter = None
+
+    def enable(self, json_path=None, prometheus_path=None, interval=10.0):
+        """
+        Turns instrumentation on.
+
+        Args:
+            json_path: Optional path of the JSON export.
+            prometheus_path: Optional path of the Prometheus text-format export (e.g. for node_exporter's
+                             textfile collector).
+            interval: Seconds between exports. A final export is always written at exit.
+        """
+        self.json_path, self.prometheus_path, self.interval = json_path, prometheus_path, interval
+        self.enabled = True
+        if (json_path or prometheus_path) and self._exporter is None:
+            self._stop.clear()
+            self._exporter = threading.Thread(target=self._export_loop, name="metrics-exporter", daemon=True)
+            self._exporter.start()
+            atexit.register(self.disable)
+
+    def disable(self):
+        """ Turns instrumentation off, writing a last export. """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        if self._exporter is not None:
+            self._exporter.join()
+            self._exporter = None
+        self.export()
+
+    def reset(self):
+        with self._lock:
+            self.histograms, self.counters, self.gauges = {}, {}, {}
+            self._started = time.time()
+
+    def histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        return histogram
+
+    def timer(self, stage):
+        """ Context manager timing a block into the stage's histogram. """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(stage))
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    def count(self, event, n=1):
+        """ Adds n to an event counter, e.g. 'frames_dropped'. """
+        if self.enabled:
+            with self._lock:
+                self.counters[event] = self.counters.get(event, 0) + n
+
+    def gauge(self, name, value):
+        """ Records the current value of a gauge, e.g. a queue depth. """
+        if self.enabled:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        """ Current metrics as a JSON-serializable dictionary. """
+        with self._lock:
+            histograms, counters, gauges = dict(self.histograms), dict(self.counters), dict(self.gauges)
+        return {"timestamp": time.time(), "uptime_s": time.time() - self._started,
+                "stages": {stage: histogram.summary() for stage, histogram in sorted(histograms.items())},
+                "counters": counters, "gauges": gauges}
+
+    def prometheus_text(self, prefix="pose"):
+        """ Current metrics in the Prometheus text exposition format. """
+        with self._lock:
+            histograms, counters, gauges = dict(self.histograms), dict(self.counters), dict(self.gauges)
+
+        lines = [f"# HELP {prefix}_stage_seconds Latency of each pipeline stage.",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.9g}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines += [f"# HELP {prefix}_events_total Pipeline events such as dropped frames.",
+                  f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{event="{event}"}} {n}' for event, n in sorted(counters.items())]
+        lines += [f"# HELP {prefix}_gauge Current values such as queue depths.", f"# TYPE {prefix}_gauge gauge"]
+        lines += [f'{prefix}_gauge{{name="{name}"}} {value}' for name, value in sorted(gauges.items())]
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """ Writes the configured export files, each atomically so readers never see a partial file. """
+        for path, render in ((self.json_path, lambda: json.dumps(self.snapshot(), indent=2)),
+                             (self.prometheus_path, self.prometheus_text)):
+            if not path:
+                continue
+            # A temporary file of its own, so another exporter of the same path never replaces it half-written
+            fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                                  prefix=os.path.basename(path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as file:
+                    file.write(render())
+                os.replace(temporary_path, path)
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
+
+    def _export_loop(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+
+def timed(stage):
+    """ Decorator timing every call of a function into a stage histogram while metrics are enabled. """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.histogram(stage).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def process_path(path):
+    """
+    Export path of the current process: the path itself in the process that enabled metrics from the environment
+    first, and the path with the process ID before its extension (metrics.1234.json) in the worker processes it
+    spawns, which inherit the same environment.
+    """
+    if not path or os.environ.get("POSE_METRICS_OWNER_PID") == str(os.getpid()):
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{extension}"
+
+
+# Process-wide instance used by the instrumented modules
+metrics = Metrics()
+
+# Enabling instrumentation from the environment, so scripts can be profiled in production without code changes:
+# POSE_METRICS_JSON=metrics.json POSE_METRICS_PROM=metrics.prom python pushups_tracker.py
+if os.environ.get("POSE_METRICS_JSON") or os.environ.get("POSE_METRICS_PROM"):
+    os.environ.setdefault("POSE_METRICS_OWNER_PID", str(os.getpid()))
+    metrics.enable(process_path(os.environ.get("POSE_METRICS_JSON")), process_path(os.environ.get("POSE_METRICS_PROM")),
+                   float(os.environ.get("POSE_METRICS_INTERVAL", 10)))
@@ -0,0 +1,59 @@
+import os
+import time
+
+# Model weights used by the trackers. Each is looked up, in order, in the file named by its environment variable,
+# in $POSE_MODEL_DIR, in the local cache directory, in ./YOLO_WEIGHTS and in the working directory.
+MODELS = {
+    "yolov8n": {"file": "yolov8n.pt", "env": "POSE_MODEL_YOLOV8N",
+                "url": "https://github.com/ultralytics/assets/releases/download/v8.1.0/yolov8n.pt"},
+}
+
+# Seconds spent loading each model, for the startup report of main.py
+load_times = {}
+
+_loaded = {}
+
+
+def model_dir():
+    """ Directory of the local model cache: $POSE_MODEL_DIR, else ~/.cache/pose-tracking/models. """
+    return os.environ.get("POSE_MODEL_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "pose-tracking", "models")
+
+
+def resolve_model(name):
+    """
+    Finds the weights file of a registered model without importing any backend.
+
+    Args:
+        name: Name of the model in MODELS, e.g. 'yolov8n'.
+
+    Returns:
+        Path of the weights file.
+    """
+    if name not in MODELS:
+        raise KeyError(f"Unknown model '{name}', expected one of {sorted(MODELS)}")
+    entry = MODELS[name]
+
+    override = os.environ.get(entry["env"])
+    if override:
+        if not os.path.isfile(override):
+            raise FileNotFoundError(f"${entry['env']} points to {override}, which doesn't exist")
+        return override
+
+    candidates = [os.path.join(model_dir(), entry["file"]), os.path.join("YOLO_WEIGHTS", entry["file"]), entry["file"]]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"Weights of '{name}' not found in {candidates}. Download them from {entry['url']} into "
+                            f"{model_dir()} or point ${entry['env']} to the file.")
+
+
+def load_yolo(name="yolov8n"):
+    """ Loads a registered YOLO model, importing ultralytics on first use. Later calls return the same model. """
+    if name not in _loaded:
+        path = resolve_model(name)
+        from ultralytics import YOLO
+
+        start = time.perf_counter()
+        _loaded[name] = YOLO(path)
+        load_times[name] = time.perf_counter() - start
+    return _loaded[name]
@@ -0,0 +1,150 @@
+import queue
+import threading
+
+from Pose_estimationModule import PoseDetector
+from metrics import metrics
+
+# Marker passed down the queues once the source is exhausted
+_END = object()
+
+
+class _StageError:
+    """ Wraps an exception raised inside a worker so it can be re-raised on the calling thread. """
+
+    def __init__(self, error):
+        self.error = error
+
+
+class PosePipeline:
+    """
+    Runs decode, pose inference, counting, rendering and encoding on separate worker threads.
+
+    Every stage is a single thread connected to the next one by a bounded queue, so frames are delivered
+    in their original order and a slow stage makes the faster ones wait instead of buffering without limit.
+    OpenCV and MediaPipe release the GIL while they work, so the stages overlap on multi-core machines.
+
+    Example:
+        pipeline = PosePipeline(PoseDetector(), count_fn=count_squats, render_fn=draw_squats, writer=out)
+        for index, frame, landmarks, result in pipeline.run(cap):
+            cv.imshow("Video", frame)
+    """
+
+    def __init__(self, detector=None, count_fn=None, render_fn=None, writer=None, queue_size=8, draw=False):
+        """
+        Args:
+            detector: PoseDetector used by the inference stage (a new one is created if omitted).
+            count_fn: Optional count stage, called as count_fn(index, landmarks) in frame order. Its return
+                      value is handed to the render stage and yielded with the frame.
+            render_fn: Optional render stage, called as render_fn(frame, landmarks, result) to draw overlays
+                       onto the frame in place.
+            writer: Optional object with a write(frame) method (e.g. cv.VideoWriter) used by the encode stage.
+            queue_size: Maximum number of frames waiting between two stages.
+            draw: Whether the inference stage draws the skeleton on the frame.
+        """
+        self.detector = detector if detector is not None else PoseDetector()
+        self.count_fn = count_fn
+        self.render_fn = render_fn
+        self.writer = writer
+        self.queue_size = queue_size
+        self.draw = draw
+        self._stop = threading.Event()
+
+    def _put(self, q, item):
+        # Blocking put that gives up once the pipeline is stopped
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                metrics.gauge(f"queue_depth_{q.name}", q.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        # Blocking get that gives up once the pipeline is stopped
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _decode(self, cap, out_q):
+        index = 0
+        try:
+            while not self._stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if not self._put(out_q, (index, frame, None, None)):
+                    return
+                index += 1
+        except Exception as error:
+            self._put(out_q, _StageError(error))
+            return
+        self._put(out_q, _END)
+
+    def _worker(self, work, in_q, out_q):
+        while True:
+            item = self._get(in_q)
+            if item is _END or isinstance(item, _StageError):
+                self._put(out_q, item)
+                return
+            try:
+                item = work(*item)
+            except Exception as error:
+                self._put(out_q, _StageError(error))
+                return
+            if not self._put(out_q, item):
+                return
+
+    def _infer(self, index, frame, landmarks, result):
+        frame = self.detector.find_pose(frame, draw=self.draw)
+        return index, frame, self.detector.get_positions(frame), result
+
+    def _count(self, index, frame, landmarks, result):
+        if self.count_fn is not None:
+            result = self.count_fn(index, landmarks)
+        return index, frame, landmarks, result
+
+    def _render(self, index, frame, landmarks, result):
+        if self.render_fn is not None:
+            self.render_fn(frame, landmarks, result)
+        return index, frame, landmarks, result
+
+    def _encode(self, index, frame, landmarks, result):
+        if self.writer is not None:
+            self.writer.write(frame)
+        return index, frame, landmarks, result
+
+    def run(self, cap):
+        """
+        Processes every frame of cap and yields (index, frame, landmarks, result) tuples in frame order.
+
+        Args:
+            cap: Frame source with a read() method returning (ret, frame), such as cv.VideoCapture.
+
+        Breaking out of the loop stops all workers; exceptions raised by a stage are re-raised here.
+        """
+        self._stop.clear()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(5)]
+        for q, name in zip(queues, ("infer", "count", "render", "encode", "output")):
+            q.name = name  # Named after the stage reading from it, for the queue depth gauges
+        threads = [threading.Thread(target=self._decode, args=(cap, queues[0]), daemon=True)]
+        for work, in_q, out_q in zip((self._infer, self._count, self._render, self._encode), queues, queues[1:]):
+            threads.append(threading.Thread(target=self._worker, args=(work, in_q, out_q), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.error
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
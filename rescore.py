@@ -0,0 +1,101 @@
+import argparse
+import copy
+import sys
+import time
+
+import cv2 as cv
+import numpy as np
+
+from Pose_estimationModule import PoseDetector
+from exercises import RULES, RuleEngine
+
+
+def load_session_landmarks(video_path, cache_dir, **detector_kwargs):
+    """
+    Loads the landmarks of a whole video from the landmark cache, running MediaPipe once on a cache miss.
+
+    Args:
+        video_path: Path of the video file.
+        cache_dir: Directory of the landmark cache.
+        detector_kwargs: PoseDetector settings; they are part of the cache key.
+
+    Returns:
+        A (T, 33, 4) float32 array of pixel-space (x, y, z, visibility), NaN for frames without a pose.
+    """
+    detector = PoseDetector(cache_dir=cache_dir, **detector_kwargs)
+    cap = cv.VideoCapture(video_path)
+    w, h, frame_count = (int(cap.get(x)) for x in (cv.CAP_PROP_FRAME_WIDTH, cv.CAP_PROP_FRAME_HEIGHT,
+                                                   cv.CAP_PROP_FRAME_COUNT))
+
+    if not detector.open_cache(video_path, frame_count):
+        # Cache miss: running inference over the whole video once to fill the cache
+        rows = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            detector.find_pose(frame, draw=False)
+            landmark_array = detector.get_landmark_array(frame)
+            rows.append(np.full((33, 4), np.nan, dtype=np.float32) if landmark_array is None else landmark_array.copy())
+        cap.release()
+        if not rows:
+            raise RuntimeError(f"Couldn't read any frames from {video_path}")
+
+        # The video was read to its end; the entry is saved unless fewer frames than announced were decoded
+        detector.close_cache(complete=True)
+        if len(rows) < frame_count:
+            print(f"Only {len(rows)} of {frame_count} frames of {video_path} could be decoded; not caching them",
+                  file=sys.stderr)
+        return np.stack(rows)
+    cap.release()
+
+    # Converting the normalized cached landmarks to pixel coordinates
+    landmarks = np.array(detector.cache.landmarks, dtype=np.float32)
+    landmarks[..., :3] *= np.array([w, h, w], dtype=np.float32)
+    detector.close_cache()
+    return landmarks
+
+
+def with_thresholds(counter, reset_threshold=None, count_threshold=None):
+    """ Returns a copy of a counter with other thresholds but the same comparisons and stages. """
+    counter = copy.copy(counter)
+    if reset_threshold is not None:
+        counter.reset_when = (counter.reset_when[0], reset_threshold)
+    if count_threshold is not None:
+        counter.count_when = (counter.count_when[0], count_threshold)
+    return counter
+
+
+def rescore(landmarks, exercise, reset_threshold=None, count_threshold=None):
+    """
+    Counts an exercise over cached session landmarks, optionally with different thresholds.
+
+    Frames without a pose have a NaN signal, so they never change the counter's stage.
+
+    Returns:
+        Final stage and count.
+    """
+    engine = RuleEngine([exercise])
+    counter = with_thresholds(engine.counters[0], reset_threshold, count_threshold)
+    result = counter.run_batch(engine.signals(landmarks)[:, 0], counter.initial_stage)
+    return result["stage"], result["count"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-count an exercise from cached landmarks.")
+    parser.add_argument("video_path")
+    parser.add_argument("exercise", choices=sorted(RULES))
+    parser.add_argument("--cache-dir", default=".landmark_cache", help="Directory of the landmark cache")
+    parser.add_argument("--reset-threshold", type=float, default=None, help="Override the reset threshold")
+    parser.add_argument("--count-threshold", type=float, default=None, help="Override the counting threshold")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    landmarks = load_session_landmarks(args.video_path, args.cache_dir)
+    stage, count = rescore(landmarks, args.exercise, args.reset_threshold, args.count_threshold)
+    print(f"{args.exercise}: {count} (final stage: {stage}, {len(landmarks)} frames, "
+          f"{time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import cv2 as cv
+
+from exercises import EXERCISES, RuleEngine
+from video_io import open_video_source
+
+
+class _Stream:
+    """ One stream running in a worker: its source, a borrowed warm detector and the exercise's rule engine. """
+
+    def __init__(self, config, detector):
+        self.config = config
+        self.name = config["name"]
+        self.detector = detector
+        self.engine = RuleEngine(EXERCISES[config["exercise"]])
+
+        # Streams moved from another worker resume where they stopped: same counts, same file position
+        state = config.get("state") or {}
+        self.frame_index = state.get("frame_index", 0)
+        if state:
+            self.engine.stages, self.engine.counts = list(state["stages"]), list(state["counts"])
+        source = config["source"]
+        seek = self.frame_index and isinstance(source, str) and os.path.isfile(source)
+        self.cap = open_video_source(source, backend="opencv" if seek else "auto")
+        if seek:
+            self.cap.cap.set(cv.CAP_PROP_POS_FRAMES, self.frame_index)
+
+    def step(self):
+        """ Processes the next frame. Returns None at the end of the stream, else whether a count changed. """
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        counts = list(self.engine.counts)
+        self.detector.find_pose(frame, draw=False)
+        self.engine.update(self.detector.get_landmark_array(frame))
+        self.frame_index += 1
+        return self.engine.counts != counts
+
+    def state(self):
+        return {"frame_index": self.frame_index, "stages": list(self.engine.stages), "counts": list(self.engine.counts)}
+
+    def report(self):
+        # The state lets the server resume the stream elsewhere if this worker dies
+        return {"name": self.name, "frame": self.frame_index, "counts": self.engine.summary(), "state": self.state()}
+
+    def release(self):
+        self.cap.release()
+
+
+def _worker(worker_id, warm_detectors, detector_kwargs, commands, events):
+    """
+    Worker process: keeps warm PoseDetectors and runs the streams assigned to it round-robin, one frame each.
+
+    Commands are (command, payload) tuples: ('start', stream config), ('stop', (name, handoff)) and
+    ('shutdown', None). Events sent back are (event, worker_id, payload) tuples.
+    """
+    from Pose_estimationModule import PoseDetector
+
+    # Loading the models once; streams borrow a detector and give it back when they stop
+    idle = [PoseDetector(**detector_kwargs) for _ in range(warm_detectors)]
+    streams = {}
+    events.put(("ready", worker_id, None))
+
+    def release(name):
+        stream = streams.pop(name)
+        stream.release()
+        stream.detector.reset()
+        idle.append(stream.detector)
+        return stream
+
+    while True:
+        # Handling commands, blocking only while there is nothing to process
+        while True:
+            try:
+                command, payload = commands.get(block=not streams)
+            except queue.Empty:
+                break
+            if command == "shutdown":
+                for name in list(streams):
+                    release(name)
+                for detector in idle:
+                    detector.close()
+                return
+            if command == "start":
+                detector = idle.pop() if idle else PoseDetector(**detector_kwargs)
+                try:
+                    streams[payload["name"]] = _Stream(payload, detector)
+                except Exception as error:
+                    idle.append(detector)
+                    events.put(("failed", worker_id, {"name": payload["name"], "error": repr(error)}))
+            elif command == "stop" and payload[0] in streams:
+                name, handoff = payload
+                stream = release(name)
+                events.put(("moved" if handoff else "stopped", worker_id,
+                            dict(stream.report(), config=dict(stream.config, state=stream.state()))))
+
+        for name, stream in list(streams.items()):
+            changed = stream.step()
+            if changed is None:
+                events.put(("ended", worker_id, release(name).report()))
+            elif changed:
+                events.put(("count", worker_id, stream.report()))
+
+
+class StreamServer:
+    """
+    Runs many video streams on a fixed pool of worker processes that each keep warm PoseDetector instances.
+
+    New streams go to the least loaded worker. Whenever streams start, stop or end, streams are moved from the
+    busiest to the least busy worker until loads differ by at most one; moved streams resume with the same counts
+    (and, for files, from the same frame). Counts of every stream are reported back to this process.
+
+    poll() also watches the worker processes. The streams of a worker that died (e.g. a crash in MediaPipe or the
+    OOM killer) are restarted on the live workers from their last reported state, or dropped with a 'failed'
+    event once no worker is left.
+    """
+
+    def __init__(self, workers=None, warm_detectors=2, detector_kwargs=None, status_path=None):
+        """
+        Args:
+            workers: Number of worker processes, one per CPU core by default.
+            warm_detectors: Number of PoseDetectors each worker loads at startup.
+            detector_kwargs: Keyword arguments for PoseDetector.
+            status_path: Optional JSON file rewritten with the state of every stream.
+        """
+        self.worker_count = workers or os.cpu_count() or 1
+        self.warm_detectors = warm_detectors
+        self.detector_kwargs = detector_kwargs or {}
+        self.status_path = status_path
+        self.streams = {}  # name -> {"worker", "config", "counts", "frame", "state", "resume"}
+        self._moving = {}  # name -> (source, target) workers of streams being handed off
+        self._dead = set()  # IDs of the workers whose process died
+        self._context = mp.get_context("spawn")
+        self._events = self._context.Queue()
+        self._commands = []
+        self._processes = []
+
+    def start(self):
+        for worker_id in range(self.worker_count):
+            commands = self._context.Queue()
+            process = self._context.Process(target=_worker, daemon=True, args=(
+                worker_id, self.warm_detectors, self.detector_kwargs, commands, self._events))
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+
+        # Waiting for every worker to load its models
+        ready = 0
+        while ready < self.worker_count:
+            event, _, _ = self._events.get()
+            ready += event == "ready"
+
+    def loads(self):
+        loads = [0] * self.worker_count
+        for stream in self.streams.values():
+            loads[stream["worker"]] += 1
+        return loads
+
+    def live_workers(self):
+        return [worker for worker in range(self.worker_count) if worker not in self._dead]
+
+    def _least_loaded(self):
+        live = self.live_workers()
+        if not live:
+            raise RuntimeError("Every worker process died")
+        loads = self.loads()
+        return min(live, key=loads.__getitem__)
+
+    def add_stream(self, config, worker=None):
+        """ Starts a stream ({'name', 'source', 'exercise'}) on the given or least loaded worker. """
+        if config["exercise"] not in EXERCISES:
+            raise ValueError(f"Unknown exercise '{config['exercise']}', expected one of {sorted(EXERCISES)}")
+        if worker is None:
+            worker = self._least_loaded()
+        self.streams[config["name"]] = {"worker": worker, "config": config, "counts": {}, "frame": 0, "state": "running",
+                                        "resume": config.get("state")}
+        self._commands[worker].put(("start", config))
+
+    def remove_stream(self, name):
+        stream = self.streams.get(name)
+        if stream is None:
+            return
+        if stream["state"] == "moving":
+            # Dropping it once the handoff arrives instead of restarting it
+            stream["removed"] = True
+        elif stream["state"] == "running":
+            stream["state"] = "stopping"
+            self._commands[stream["worker"]].put(("stop", (name, False)))
+
+    def rebalance(self):
+        """ Moves running streams from the busiest to the least busy worker until loads differ by at most one. """
+        loads = self.loads()
+        live = self.live_workers()
+        while live:
+            source, target = max(live, key=loads.__getitem__), min(live, key=loads.__getitem__)
+            if loads[source] - loads[target] <= 1:
+                break
+            name = next((name for name, stream in self.streams.items()
+                         if stream["worker"] == source and stream["state"] == "running"), None)
+            if name is None:
+                break
+            self.streams[name].update(worker=target, state="moving")
+            self._moving[name] = (source, target)
+            self._commands[source].put(("stop", (name, True)))
+            loads[source] -= 1
+            loads[target] += 1
+
+    def poll(self, timeout=0.5):
+        """ Handles the workers' events for up to timeout seconds. Returns the (event, payload) pairs handled. """
+        handled = []
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                event, worker_id, payload = self._events.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            handled.append((event, payload))
+            name = payload["name"]
+            entry = self._moving.get(name) if event == "moved" else None
+            if event == "moved" and (entry is None or entry[0] != worker_id or name not in self.streams):
+                # A handoff from a worker found dead meanwhile: _check_workers already restarted or dropped the
+                # stream (and may have handed it off again), so this older state must not overwrite it
+                continue
+            if event in ("count", "ended", "stopped", "moved") and name in self.streams:
+                self.streams[name].update(counts=payload["counts"], frame=payload["frame"], resume=payload["state"])
+
+            if event == "moved":
+                _, target = self._moving.pop(name)
+                if self.streams[name].get("removed"):
+                    del self.streams[name]
+                    self.rebalance()
+                else:
+                    # Resuming the handed-off stream on its new worker, or elsewhere if that one died meanwhile
+                    self._start_elsewhere(name, handled, target if target not in self._dead else None)
+            elif event in ("ended", "stopped", "failed"):
+                self.streams.pop(name, None)
+                self._moving.pop(name, None)
+                self.rebalance()
+        self._check_workers(handled)
+        return handled
+
+    def _start_elsewhere(self, name, handled, worker=None):
+        # (Re)starting a stream from its last reported state, dropping it when no worker is left
+        stream = self.streams[name]
+        try:
+            worker = self._least_loaded() if worker is None else worker
+        except RuntimeError as error:
+            del self.streams[name]
+            handled.append(("failed", {"name": name, "error": str(error)}))
+            return None
+        stream.update(worker=worker, state="running")
+        self._commands[worker].put(("start", dict(stream["config"], state=stream["resume"])))
+        return worker
+
+    def _check_workers(self, handled):
+        """ Restarts the streams of workers whose process died on the live workers. """
+        died = [worker_id for worker_id, process in enumerate(self._processes)
+                if worker_id not in self._dead and not process.is_alive()]
+        if not died:
+            return
+        for worker_id in died:
+            self._dead.add(worker_id)
+            handled.append(("worker_died", {"name": None, "worker": worker_id,
+                                            "exitcode": self._processes[worker_id].exitcode}))
+
+        for name, stream in list(self.streams.items()):
+            # Streams handed off by a dead worker never arrive; those handed to one are redirected on arrival
+            handing_off = stream["state"] == "moving" and self._moving[name][0] in died
+            running = stream["state"] == "running" and stream["worker"] in died
+            if handing_off or running:
+                self._moving.pop(name, None)
+                if stream.get("removed"):
+                    del self.streams[name]
+                    continue
+                worker = self._start_elsewhere(name, handled)
+                if worker is not None:
+                    handled.append(("restarted", {"name": name, "worker": worker}))
+            elif stream["state"] == "stopping" and stream["worker"] in died:
+                del self.streams[name]
+        self.rebalance()
+
+    def status(self):
+        return {name: {"worker": stream["worker"], "source": stream["config"]["source"],
+                       "exercise": stream["config"]["exercise"], "frame": stream["frame"], "counts": stream["counts"],
+                       "state": stream["state"]}
+                for name, stream in self.streams.items()}
+
+    def write_status(self):
+        if not self.status_path:
+            return
+        temporary_path = self.status_path + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"timestamp": time.time(), "loads": self.loads(), "dead_workers": sorted(self._dead),
+                       "streams": self.status()}, file, indent=2)
+        os.replace(temporary_path, self.status_path)
+
+    def shutdown(self):
+        for commands in self._commands:
+            commands.put(("shutdown", None))
+        for process in self._processes:
+            process.join(timeout=10)
+        self._commands, self._processes = [], []
+
+
+def _load_streams(config_path):
+    with open(config_path) as file:
+        return {stream["name"]: stream for stream in json.load(file)["streams"]}
+
+
+def serve(config_path, workers=None, warm_detectors=2, status_path=None, watch=False):
+    """
+    Runs the streams listed in a JSON config file until they all end.
+
+    The config file looks like {"streams": [{"name": "cam1", "source": "rtsp://...", "exercise": "pushups"}]}.
+    With watch, the file is re-read whenever it changes: new streams are started, removed ones stopped, and the
+    server keeps running when no stream is left.
+    """
+    server = StreamServer(workers, warm_detectors, status_path=status_path)
+    server.start()
+    configs = _load_streams(config_path)
+    for config in configs.values():
+        server.add_stream(config)
+    modified = os.path.getmtime(config_path)
+
+    try:
+        while server.streams or watch:
+            for event, payload in server.poll():
+                if event in ("count", "ended"):
+                    counts = ", ".join(f"{rule}: {count}" for rule, count in payload["counts"].items())
+                    print(f"[{payload['name']}] frame {payload['frame']}: {counts}" +
+                          (" (ended)" if event == "ended" else ""))
+                elif event == "failed":
+                    print(f"[{payload['name']}] failed: {payload['error']}")
+                elif event == "worker_died":
+                    print(f"Worker {payload['worker']} died (exit code {payload['exitcode']})")
+                elif event == "restarted":
+                    print(f"[{payload['name']}] restarted on worker {payload['worker']}")
+            server.write_status()
+
+            if watch and os.path.getmtime(config_path) != modified:
+                modified = os.path.getmtime(config_path)
+                new_configs = _load_streams(config_path)
+                for name in configs.keys() - new_configs.keys():
+                    server.remove_stream(name)
+                for name in new_configs.keys() - configs.keys():
+                    server.add_stream(new_configs[name])
+                configs = new_configs
+                server.rebalance()
+    finally:
+        server.shutdown()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count exercises on many video streams with a pool of warm workers.")
+    parser.add_argument("config", help='JSON file with {"streams": [{"name", "source", "exercise"}, ...]}')
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU core)")
+    parser.add_argument("--warm-detectors", type=int, default=2, help="PoseDetectors each worker preloads")
+    parser.add_argument("--status", default=None, help="Optional JSON file with the live state of every stream")
+    parser.add_argument("--watch", action="store_true", help="Reload the config when it changes and keep running")
+    args = parser.parse_args()
+    serve(args.config, args.workers, args.warm_detectors, args.status, args.watch)
+
+
+if __name__ == "__main__":
+    main()
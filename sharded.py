@@ -0,0 +1,141 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+from Pose_estimationModule import PoseDetector
+from counters import stitch
+from exercises import RULES, RuleEngine
+
+
+def _open_at(video_path, frame_index):
+    """
+    Opens a video positioned exactly at frame_index.
+
+    Seeking is not frame-exact with every codec, so when the capture doesn't report the requested position after
+    the seek, the video is reopened and the frames before frame_index are skipped by decoding them.
+
+    Returns:
+        The capture, and whether the video has at least frame_index frames.
+    """
+    cap = cv.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Couldn't open {video_path}")
+    if not frame_index:
+        return cap, True
+    if cap.set(cv.CAP_PROP_POS_FRAMES, frame_index) and int(cap.get(cv.CAP_PROP_POS_FRAMES)) == frame_index:
+        return cap, True
+
+    cap.release()
+    cap = cv.VideoCapture(video_path)
+    for _ in range(frame_index):
+        if not cap.grab():
+            return cap, False
+    return cap, True
+
+
+def _process_shard(video_path, exercise, start, stop, warmup, detector_kwargs):
+    """
+    Runs pose detection over frames [start - warmup, stop) and summarizes the counter over [start, stop).
+
+    The warm-up frames only feed MediaPipe's landmark smoothing and tracking, they are never counted.
+    Frames without a detected pose are skipped, like the steps scripts do. A stop of None reads to the end of
+    the video, since the frame count of many containers is only an estimate.
+
+    Returns:
+        The counter summary of the shard, its number of frames with a pose, and its number of frames read.
+    """
+    engine = RuleEngine([exercise])
+    first = max(0, start - warmup)
+    cap, reachable = _open_at(video_path, first)
+    if not reachable:
+        # The frame count overestimated the video's length; this shard starts past its end
+        cap.release()
+        return engine.counters[0].transfer([]), 0, 0
+
+    detector = PoseDetector(**detector_kwargs)
+    landmarks = []
+    index = first
+    while stop is None or index < stop:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        detector.find_pose(frame, draw=False)
+        landmark_array = detector.get_landmark_array(frame)
+        if index >= start and landmark_array is not None:
+            landmarks.append(landmark_array.copy())
+        index += 1
+    cap.release()
+    detector.close()
+
+    # Computing the signal for the whole shard in one vectorized call
+    values = engine.signals(np.stack(landmarks))[:, 0].tolist() if landmarks else []
+    return engine.counters[0].transfer(values), len(values), max(0, index - start)
+
+
+def count_video_sharded(video_path, exercise, shards=None, warmup=30, detector_kwargs=None):
+    """
+    Counts repetitions of a long video by splitting it into time shards processed in parallel.
+
+    Each worker runs PoseDetector plus the exercise's counter over its own shard for every possible entry stage,
+    and the per-shard summaries are stitched in order. Given the same landmarks, the result is identical to
+    running the counter over the whole video frame by frame.
+
+    Args:
+        video_path: Path of the video file.
+        exercise: Name of the rule in exercises.RULES, e.g. 'squats' or 'steps'.
+        shards: Number of shards and worker processes, one per CPU core by default.
+        warmup: Number of frames before each shard run through the detector (but not counted) so its
+                smoothing has warmed up by the time counting starts.
+        detector_kwargs: Keyword arguments for PoseDetector.
+
+    Returns:
+        Dictionary with the total count, final stage and number of frames with a pose.
+    """
+    if exercise not in RULES:
+        raise ValueError(f"Unknown exercise '{exercise}', expected one of {sorted(RULES)}")
+    detector_kwargs = detector_kwargs or {}
+
+    cap = cv.VideoCapture(video_path)
+    frame_count = int(cap.get(cv.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if frame_count <= 0:
+        # Without even an estimate of the length there is nothing to split: one shard reads the whole video
+        frame_count, shards = 1, 1
+
+    shards = max(1, min(shards or os.cpu_count() or 1, frame_count))
+    bounds = np.linspace(0, frame_count, shards + 1).astype(int).tolist()
+    bounds[-1] = None  # The last shard reads to the end of the video, however long it really is
+
+    with ProcessPoolExecutor(max_workers=shards) as pool:
+        futures = [pool.submit(_process_shard, video_path, exercise, start, stop, warmup, detector_kwargs)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        results = [future.result() for future in futures]
+
+    # A shard ending early is only consistent if the video really ended there, i.e. no later shard read anything
+    for shard, (start, stop) in enumerate(zip(bounds[:-2], bounds[1:-1])):
+        if results[shard][2] < stop - start and any(read for _, _, read in results[shard + 1:]):
+            raise RuntimeError(f"Shard {shard} of {video_path} read {results[shard][2]} of its {stop - start} frames "
+                               f"although later shards have frames; seeking in this video is not reliable")
+
+    counter = RuleEngine([exercise]).counters[0]
+    stage, count = stitch(counter, [summary for summary, _, _ in results])
+    return {"count": count, "stage": stage, "frames": sum(frames for _, frames, _ in results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count repetitions of a long video on several cores.")
+    parser.add_argument("video_path")
+    parser.add_argument("exercise", choices=sorted(RULES))
+    parser.add_argument("--shards", type=int, default=None, help="Number of shards (default: one per CPU core)")
+    parser.add_argument("--warmup", type=int, default=30, help="Warm-up frames before each shard")
+    args = parser.parse_args()
+
+    result = count_video_sharded(args.video_path, args.exercise, shards=args.shards, warmup=args.warmup)
+    print(f"{args.exercise}: {result['count']} (final stage: {result['stage']}, frames with a pose: {result['frames']})")
+
+
+if __name__ == "__main__":
+    main()
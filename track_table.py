@@ -0,0 +1,114 @@
+import numpy as np
+
+
+class TrackTable:
+    """
+    Per-track state of the multi-person trackers, stored as a struct of NumPy arrays indexed by slot.
+
+    lookup() maps the track IDs visible in a frame to slots, so the state of all of them can be updated with
+    one vectorized expression per column. Tracks not seen for more than max_idle_frames frames are evicted by
+    evict_idle() and their slots reused, so memory follows the number of people recently in view rather than
+    the number of people who ever walked past the camera.
+
+    Example:
+        tracks = TrackTable({"count": (np.int32, 0), "stage": (np.int8, 0)}, max_idle_frames=10 * fps)
+        slots, new = tracks.lookup(track_ids, frame_index)
+        tracks["count"][slots] += steps
+        tracks.evict_idle(frame_index)
+    """
+
+    def __init__(self, columns, capacity=32, max_idle_frames=300, on_evict=None):
+        """
+        Args:
+            columns: Dictionary mapping column names to (dtype, default) or (dtype, default, shape) tuples,
+                     shape being the per-track shape of the column, e.g. (3,) for a BGR colour.
+            capacity: Initial number of slots; the table doubles when it runs out.
+            max_idle_frames: Number of frames a track may go unseen before it is evicted.
+            on_evict: Optional callback receiving a dictionary of arrays (track_id, last_seen and every column)
+                      with the evicted tracks, e.g. to archive their final counts.
+        """
+        self.specs = {name: (spec[0], spec[1], tuple(spec[2]) if len(spec) > 2 else ()) for name, spec in columns.items()}
+        self.max_idle_frames = max_idle_frames
+        self.on_evict = on_evict
+
+        self.track_ids = np.full(capacity, -1, dtype=np.int64)  # -1 marks a free slot
+        self.last_seen = np.zeros(capacity, dtype=np.int64)
+        self.columns = {name: np.full((capacity,) + shape, default, dtype=dtype)
+                        for name, (dtype, default, shape) in self.specs.items()}
+        self._slots = {}  # track_id -> slot
+        self._free = list(range(capacity - 1, -1, -1))  # Free slots, lowest popped first
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, track_id):
+        return track_id in self._slots
+
+    def occupied(self):
+        """ Slots currently holding a track. """
+        return np.flatnonzero(self.track_ids >= 0)
+
+    def values(self, name):
+        """ Dictionary mapping the ID of every track in the table to its value in a column. """
+        slots = self.occupied()
+        return dict(zip(self.track_ids[slots].tolist(), self.columns[name][slots].tolist()))
+
+    @property
+    def capacity(self):
+        return len(self.track_ids)
+
+    def _grow(self):
+        # Doubling every array; existing slots keep their index
+        capacity = self.capacity
+        self.track_ids = np.concatenate((self.track_ids, np.full(capacity, -1, dtype=np.int64)))
+        self.last_seen = np.concatenate((self.last_seen, np.zeros(capacity, dtype=np.int64)))
+        for name, (dtype, default, shape) in self.specs.items():
+            self.columns[name] = np.concatenate(
+                (self.columns[name], np.full((capacity,) + shape, default, dtype=dtype)))
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def lookup(self, track_ids, frame_index):
+        """
+        Returns the slots of the given tracks, allocating (and resetting to the defaults) slots for new ones,
+        and marks them as seen at frame_index.
+
+        Returns:
+            slots: Integer array with the slot of every track ID, in order.
+            new: Boolean array, True for the tracks that just got a slot.
+        """
+        slots = np.empty(len(track_ids), dtype=np.intp)
+        new = np.zeros(len(track_ids), dtype=bool)
+        for i, track_id in enumerate(track_ids):
+            slot = self._slots.get(track_id)
+            if slot is None:
+                if not self._free:
+                    self._grow()
+                slot = self._slots[track_id] = self._free.pop()
+                self.track_ids[slot] = track_id
+                new[i] = True
+            slots[i] = slot
+
+        if new.any():
+            for name, (_, default, _) in self.specs.items():
+                self.columns[name][slots[new]] = default
+        self.last_seen[slots] = frame_index
+        return slots, new
+
+    def evict_idle(self, frame_index):
+        """ Frees the slots of tracks unseen for more than max_idle_frames frames. Returns how many were evicted. """
+        idle = np.flatnonzero((self.track_ids >= 0) & (frame_index - self.last_seen > self.max_idle_frames))
+        if not len(idle):
+            return 0
+        if self.on_evict is not None:
+            evicted = {"track_id": self.track_ids[idle].copy(), "last_seen": self.last_seen[idle].copy()}
+            evicted.update((name, column[idle].copy()) for name, column in self.columns.items())
+            self.on_evict(evicted)
+
+        for track_id in self.track_ids[idle].tolist():
+            del self._slots[track_id]
+        self.track_ids[idle] = -1
+        self._free.extend(idle[::-1].tolist())
+        return len(idle)
@@ -1,12 +1,26 @@
+from collections import OrderedDict
+
 import cv2 as cv
+import numpy as np
 
+from metrics import timed
 
 
 def draw_overlay(frame, pt1, pt2, alpha=0.25, color=(51, 68, 255), filled=True):
-    overlay = frame.copy()
+    """ Tints a rectangle of the frame, blending only the pixels inside it. """
+    h, w = frame.shape[:2]
+    x1, x2 = sorted((pt1[0], pt2[0]))
+    y1, y2 = sorted((pt1[1], pt2[1]))
+    rx1, ry1, rx2, ry2 = max(x1, 0), max(y1, 0), min(x2 + 1, w), min(y2 + 1, h)
+    if rx1 >= rx2 or ry1 >= ry2:
+        return
+
+    # Drawing and blending the rectangle on its region of interest only, instead of copying the whole frame
+    roi = frame[ry1:ry2, rx1:rx2]
+    overlay = roi.copy()
     rect_color = color if filled else (0, 0, 0)
-    cv.rectangle(overlay, pt1, pt2, rect_color, cv.FILLED if filled else 1)
-    cv.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+    cv.rectangle(overlay, (x1 - rx1, y1 - ry1), (x2 - rx1, y2 - ry1), rect_color, cv.FILLED if filled else 1)
+    cv.addWeighted(overlay, alpha, roi, 1 - alpha, 0, roi)
 
 
 def draw_rounded_rect(img, bbox, line_color=(255, 255, 255), ellipse_color=(0, 0, 255), line_thickness=2,
@@ -27,11 +41,164 @@ def draw_rounded_rect(img, bbox, line_color=(255, 255, 255), ellipse_color=(0, 0
     cv.ellipse(img, (x2 - radius, y2 - radius), (radius, radius), 0, 0, 90, ellipse_color, ellipse_thickness)     # Bottom-right corner
 
 
+class HUD:
+    """
+    Heads-up display layer that composites all overlays of a frame in one pass.
+
+    Labels (text on a background rectangle) are rasterized once per text, font, scale, thickness and colours into
+    sprites kept in an LRU cache, so unchanged labels like "Count: 12" are only copied onto later frames.
+    Tinted rectangles are blended on their region of interest only.
+    """
+
+    def __init__(self, max_sprites=256):
+        self.max_sprites = max_sprites
+        self._sprites = OrderedDict()
+        self._items = []
+
+    def _sprite(self, text, font, font_scale, thickness, bg_color, text_color):
+        key = (text, font, font_scale, thickness, tuple(bg_color), tuple(text_color))
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        # Rendering the label like draw_text_with_bg would, plus a margin for glyphs reaching past the rectangle
+        (text_width, text_height), baseline = cv.getTextSize(text, font, font_scale, thickness)
+        pad = thickness + 2
+        rect_w, rect_h = text_width + 1, text_height + 2 * baseline + 1
+        origin = (pad, pad + text_height + baseline)
+        pixels = np.zeros((rect_h + 2 * pad, rect_w + 2 * pad, 3), dtype=np.uint8)
+        cv.rectangle(pixels, (pad, pad), (pad + rect_w - 1, pad + rect_h - 1), bg_color, cv.FILLED)
+        cv.putText(pixels, text, origin, font, font_scale, text_color, thickness, lineType=cv.LINE_AA)
+
+        # Opacity: the rectangle is opaque, outside it only the anti-aliased glyph coverage counts
+        coverage = np.zeros(pixels.shape[:2], dtype=np.uint8)
+        cv.putText(coverage, text, origin, font, font_scale, 255, thickness, lineType=cv.LINE_AA)
+        coverage[pad:pad + rect_h, pad:pad + rect_w] = 255
+        weights = coverage.astype(np.float32) / 255
+
+        # Offset of the sprite's top-left corner from the text position
+        offset = (-pad, -(pad + text_height + baseline))
+        sprite = self._sprites[key] = (pixels, weights, 1 - weights, offset)
+        if len(self._sprites) > self.max_sprites:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def _blit(self, frame, sprite, pos):
+        pixels, weights, inverse_weights, (dx, dy) = sprite
+        h, w = frame.shape[:2]
+        x1, y1 = pos[0] + dx, pos[1] + dy
+        x2, y2 = x1 + pixels.shape[1], y1 + pixels.shape[0]
+
+        # Clipping the sprite to the frame
+        fx1, fy1, fx2, fy2 = max(x1, 0), max(y1, 0), min(x2, w), min(y2, h)
+        if fx1 >= fx2 or fy1 >= fy2:
+            return
+        sx1, sy1, sx2, sy2 = fx1 - x1, fy1 - y1, fx2 - x1, fy2 - y1
+        roi = frame[fy1:fy2, fx1:fx2]
+        cv.blendLinear(pixels[sy1:sy2, sx1:sx2], roi, weights[sy1:sy2, sx1:sx2],
+                       inverse_weights[sy1:sy2, sx1:sx2], dst=roi)
+
+    def add_text(self, text, pos, font=cv.FONT_HERSHEY_SIMPLEX, font_scale=0.3, thickness=1, bg_color=(255, 255, 255),
+                 text_color=(0, 0, 0)):
+        """ Queues a label with the same arguments as draw_text_with_bg. """
+        self._items.append((self._sprite(text, font, font_scale, thickness, bg_color, text_color), tuple(pos)))
+
+    def add_overlay(self, pt1, pt2, alpha=0.25, color=(51, 68, 255), filled=True):
+        """ Queues a tinted rectangle with the same arguments as draw_overlay. """
+        self._items.append((None, (pt1, pt2, alpha, color, filled)))
+
+    @timed("draw_hud")
+    def render(self, frame):
+        """ Composites every queued overlay onto the frame, in the order they were added, and clears the queue. """
+        for sprite, args in self._items:
+            if sprite is None:
+                draw_overlay(frame, *args)
+            else:
+                self._blit(frame, sprite, args)
+        self._items.clear()
+        return frame
+
+    def draw_text(self, frame, text, pos, **kwargs):
+        """ Draws a single label right away, using the sprite cache. """
+        self._blit(frame, self._sprite(text, **{**_TEXT_DEFAULTS, **kwargs}), tuple(pos))
+
+
+_TEXT_DEFAULTS = {"font": cv.FONT_HERSHEY_SIMPLEX, "font_scale": 0.3, "thickness": 1, "bg_color": (255, 255, 255),
+                  "text_color": (0, 0, 0)}
+
+# Distinct BGR colours handed out to tracked people by track_color()
+TRACK_PALETTE = [(255, 0, 0), (0, 0, 255), (255, 255, 0), (0, 255, 0), (255, 0, 255), (0, 255, 255), (128, 0, 255),
+                 (255, 128, 0), (0, 128, 255), (128, 255, 0)]
+
+
+def track_color(track_id):
+    """ Returns a stable colour for a track ID. """
+    return TRACK_PALETTE[int(track_id) % len(TRACK_PALETTE)]
+
+
+class SkeletonRenderer:
+    """
+    Draws pose skeletons from landmark arrays, with all bones in one cv.polylines call and all joints in another.
+
+    The connection index pairs are converted to an array once, so drawing a pose is a couple of NumPy gathers
+    plus two OpenCV calls instead of a Python loop over every landmark and connection.
+    """
+
+    def __init__(self, connections, bone_color=(224, 224, 224), joint_color=(0, 0, 255), thickness=2, radius=2,
+                 min_visibility=0.5):
+        """
+        Args:
+            connections: Iterable of (start, end) landmark index pairs, e.g. mp.solutions.pose.POSE_CONNECTIONS.
+            bone_color, joint_color: Default BGR colours.
+            thickness: Bone thickness in pixels.
+            radius: Joint radius in pixels.
+            min_visibility: Landmarks below this visibility, and the bones touching them, are not drawn.
+        """
+        self.connections = np.array(sorted(connections), dtype=np.intp).reshape(-1, 2)
+        self.bone_color, self.joint_color = bone_color, joint_color
+        self.thickness, self.radius = thickness, radius
+        self.min_visibility = min_visibility
+
+    @timed("draw_skeleton")
+    def draw(self, frame, landmarks, color=None, joint_color=None):
+        """
+        Draws one skeleton.
+
+        Args:
+            frame: Frame to draw on, in place.
+            landmarks: Pixel-space landmark array of shape (33, 2) or (33, 4) as from PoseDetector.get_landmark_array.
+            color: Optional bone colour, e.g. track_color(track_id) for the multi-person scripts.
+            joint_color: Optional joint colour.
+        """
+        if landmarks is None:
+            return frame
+        points = landmarks[:, :2].astype(np.int32)
+        if landmarks.shape[1] > 3:
+            visible = landmarks[:, 3] >= self.min_visibility
+        else:
+            visible = np.ones(len(points), dtype=bool)
+
+        # Every visible bone as a two-point polyline, drawn in a single call
+        bones = self.connections[visible[self.connections].all(axis=1)]
+        if len(bones):
+            cv.polylines(frame, list(points[bones]), False, color or self.bone_color, self.thickness, cv.LINE_AA)
+
+        # Every visible joint as a zero-length thick line, which OpenCV draws as a filled disc
+        joints = points[visible]
+        if len(joints):
+            cv.polylines(frame, list(np.repeat(joints[:, None, :], 2, axis=1)), False, joint_color or self.joint_color,
+                         2 * self.radius, cv.LINE_AA)
+        return frame
+
+
+# Sprite cache shared by every draw_text_with_bg call
+_hud = HUD()
+
+
 def draw_text_with_bg(frame, text, pos, font=cv.FONT_HERSHEY_SIMPLEX, font_scale=0.3, thickness=1, bg_color=(255, 255, 255),
                       text_color=(0, 0, 0)):
-    """ Draws text with a background rectangle. """
-    (text_width, text_height), baseline = cv.getTextSize(text, font, font_scale, thickness)
-    x, y = pos
-    cv.rectangle(frame, (x, y - text_height - baseline), (x + text_width, y + baseline), bg_color, cv.FILLED)
-    cv.putText(frame, text, (x, y), font, font_scale, text_color, thickness, lineType=cv.LINE_AA)
+    """ Draws text with a background rectangle, reusing the label's cached sprite when it was drawn before. """
+    _hud.draw_text(frame, text, pos, font=font, font_scale=font_scale, thickness=thickness, bg_color=bg_color,
+                   text_color=text_color)
 
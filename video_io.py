@@ -0,0 +1,350 @@
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+from metrics import metrics, timed
+
+try:
+    import av  # PyAV, optional: enables frame-threaded decoding with decoder-side scaling
+except ImportError:
+    av = None
+
+
+def _scaled_size(frame_size, scale):
+    # Scaling (width, height) and rounding down to even numbers, which yuv420p encoders require
+    w, h = frame_size
+    if scale == 1:
+        return w, h
+    return max(2, int(w * scale) // 2 * 2), max(2, int(h * scale) // 2 * 2)
+
+
+def _rate_control(codec, preset, crf):
+    # Speed and quality options of an encoder: x264/x265 take a preset and a CRF, NVENC a constant quality level
+    if codec in ("libx264", "libx265"):
+        return ["-preset", preset, "-crf", str(crf)]
+    if codec.endswith("_nvenc"):
+        return ["-rc", "vbr", "-cq", str(crf)]
+    return ["-crf", str(crf)]
+
+
+class FFmpegWriter:
+    """
+    Video writer that streams raw BGR frames into a local ffmpeg process.
+
+    It has the same write/release/isOpened interface as cv.VideoWriter, so the scripts can use either.
+    """
+
+    def __init__(self, filename, fps, frame_size, codec="libx264", preset="veryfast", crf=23, threads=0, scale=1.0,
+                 ffmpeg="ffmpeg"):
+        """
+        Args:
+            filename: Path of the output video.
+            fps: Frame rate of the output video.
+            frame_size: (width, height) of the frames passed to write().
+            codec: ffmpeg video encoder, e.g. 'libx264', 'libx265' or 'h264_nvenc'.
+            preset: Encoder speed preset ('ultrafast' ... 'veryslow'), used by x264/x265 only.
+            crf: Constant rate factor, higher means smaller files and lower quality. NVENC encoders get it as
+                 their constant quality (-cq) instead.
+            threads: Number of encoder threads, 0 lets ffmpeg decide.
+            scale: Output downscale factor applied by ffmpeg, e.g. 0.5 for half resolution.
+            ffmpeg: Name or path of the ffmpeg executable.
+        """
+        self.frame_size = tuple(frame_size)
+        self.output_size = _scaled_size(frame_size, scale)
+        w, h = self.frame_size
+
+        command = [ffmpeg, "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", str(fps), "-i", "-", "-an"]
+        if self.output_size != self.frame_size:
+            command += ["-vf", "scale={}:{}:flags=area".format(*self.output_size)]
+        command += ["-c:v", codec] + _rate_control(codec, preset, crf)
+        command += ["-threads", str(threads), "-pix_fmt", "yuv420p", filename]
+
+        # ffmpeg's errors go to a temporary file rather than a pipe, which would block the encoder once full
+        self._errors = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=self._errors)
+
+    def _error_output(self):
+        self._errors.seek(0)
+        return self._errors.read().decode(errors="replace").strip()
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    @timed("write")
+    def write(self, frame):
+        if frame.shape[1::-1] != self.frame_size:
+            raise ValueError(f"Expected frames of size {self.frame_size}, got {frame.shape[1::-1]}")
+        try:
+            # Writing the frame buffer directly, without an intermediate bytes copy
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.process.wait()
+            raise RuntimeError(f"ffmpeg stopped accepting frames: {self._error_output()}")
+
+    def release(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        error = self._error_output()
+        self._errors.close()
+        self.process = None
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode}: {error}")
+
+
+class OpenCVWriter:
+    """ cv.VideoWriter with the same optional output downscale as FFmpegWriter. """
+
+    def __init__(self, filename, fps, frame_size, fourcc="mp4v", scale=1.0):
+        self.frame_size = tuple(frame_size)
+        self.output_size = _scaled_size(frame_size, scale)
+        self.writer = cv.VideoWriter(filename, cv.VideoWriter_fourcc(*fourcc), fps, self.output_size)
+
+    def isOpened(self):
+        return self.writer.isOpened()
+
+    @timed("write")
+    def write(self, frame):
+        if self.output_size != self.frame_size:
+            frame = cv.resize(frame, self.output_size, interpolation=cv.INTER_AREA)
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+def create_video_writer(filename, fps, frame_size, backend="auto", codec="libx264", preset="veryfast", crf=23,
+                        threads=0, scale=1.0, fourcc="mp4v", ffmpeg="ffmpeg"):
+    """
+    Creates the video writer used by the scripts in place of cv.VideoWriter.
+
+    Args:
+        filename: Path of the output video.
+        fps: Frame rate of the output video.
+        frame_size: (width, height) of the input frames.
+        backend: 'ffmpeg', 'opencv', or 'auto' to use ffmpeg when it is installed and OpenCV otherwise.
+        codec, preset, crf, threads: Encoder settings for the ffmpeg backend.
+        scale: Output downscale factor, supported by both backends.
+        fourcc: FourCC code for the OpenCV backend.
+        ffmpeg: Name or path of the ffmpeg executable.
+
+    Returns:
+        An object with write(frame), release() and isOpened() methods.
+    """
+    if backend not in ("auto", "ffmpeg", "opencv"):
+        raise ValueError(f"Unknown video writer backend: {backend}")
+
+    if backend != "opencv":
+        if shutil.which(ffmpeg):
+            return FFmpegWriter(filename, fps, frame_size, codec=codec, preset=preset, crf=crf, threads=threads,
+                                scale=scale, ffmpeg=ffmpeg)
+        if backend == "ffmpeg":
+            raise RuntimeError(f"ffmpeg executable '{ffmpeg}' was not found")
+        print("ffmpeg not found, falling back to OpenCV's video writer", file=sys.stderr)
+
+    return OpenCVWriter(filename, fps, frame_size, fourcc=fourcc, scale=scale)
+
+
+def _target_size(frame_size, scale=1.0, max_side=None):
+    # Output size of a source, given a scale factor and/or a cap on the longest side
+    if max_side is not None:
+        scale = min(scale, max_side / max(frame_size))
+    return _scaled_size(frame_size, scale) if scale < 1 else tuple(frame_size)
+
+
+class OpenCVSource:
+    """
+    cv.VideoCapture that optionally resizes frames to a target resolution and measures decode time.
+
+    Reports the output frame size through get(), so writers created from it match the frames it returns.
+    With reuse_buffer, every frame is decoded (and resized) into the same preallocated arrays, so the returned
+    frame is only valid until the next read(); leave it off when frames are handed to other threads.
+    """
+
+    def __init__(self, video_path, scale=1.0, max_side=None, reuse_buffer=False):
+        self.cap = cv.VideoCapture(video_path)
+        self.source_size = (int(self.cap.get(cv.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv.CAP_PROP_FRAME_HEIGHT)))
+        self.frame_size = _target_size(self.source_size, scale, max_side) if self.cap.isOpened() else self.source_size
+        self.reuse_buffer = reuse_buffer
+        self._frame = None  # Capture buffer
+        self._resized = None  # Resize buffer
+        self.decode_time = 0.0  # Seconds spent decoding (and resizing)
+        self.frames_decoded = 0
+        self.allocations = 0  # Number of frame arrays allocated so far
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        if prop == cv.CAP_PROP_FRAME_WIDTH:
+            return self.frame_size[0]
+        if prop == cv.CAP_PROP_FRAME_HEIGHT:
+            return self.frame_size[1]
+        return self.cap.get(prop)
+
+    @timed("read")
+    def read(self):
+        start = time.perf_counter()
+        if not self.reuse_buffer:
+            ret, frame = self.cap.read()
+            self.allocations += ret
+            if ret and self.frame_size != self.source_size:
+                frame = cv.resize(frame, self.frame_size, interpolation=cv.INTER_AREA)
+                self.allocations += 1
+        else:
+            # Decoding into the capture buffer; OpenCV only allocates a new one if the frame size changed
+            ret, frame = self.cap.read(image=self._frame)
+            if ret and frame is not self._frame:
+                self._frame = frame
+                self.allocations += 1
+            if ret and self.frame_size != self.source_size:
+                if self._resized is None:
+                    self._resized = np.empty((self.frame_size[1], self.frame_size[0], 3), dtype=np.uint8)
+                    self.allocations += 1
+                frame = cv.resize(frame, self.frame_size, dst=self._resized, interpolation=cv.INTER_AREA)
+        self.decode_time += time.perf_counter() - start
+        self.frames_decoded += ret
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVSource:
+    """
+    Frame source decoding with PyAV on FFmpeg's frame/slice threads.
+
+    Frames are converted to BGR directly at the target resolution by the scaler, so no full-size BGR frame
+    is ever materialized. Has the same read/get/isOpened/release interface as cv.VideoCapture: a path that
+    can't be opened gives isOpened() == False, and frames the decoder fails on are skipped and counted as
+    'frames_dropped'.
+    With reuse_buffer, every frame is copied out of the scaler's output into the same preallocated array, so the
+    returned frame is only valid until the next read(), as with OpenCVSource.
+    """
+
+    def __init__(self, video_path, scale=1.0, max_side=None, threads=0, reuse_buffer=False):
+        self.reuse_buffer = reuse_buffer
+        self._buffer = None  # Output buffer with reuse_buffer
+        self.decode_time = 0.0  # Seconds spent decoding and converting
+        self.frames_decoded = 0
+        self.allocations = 0  # Number of frame arrays allocated so far (one per frame without reuse_buffer)
+        self.frame_size = self.source_size = (0, 0)
+        self.fps, self.frame_count = 0.0, 0
+        try:
+            self.container = av.open(video_path)
+        except (av.FFmpegError, OSError):
+            self.container = None
+            return
+        if not self.container.streams.video:
+            self.release()
+            return
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"  # Frame and slice threading
+        self.stream.thread_count = threads  # 0 lets FFmpeg pick one thread per core
+
+        context = self.stream.codec_context
+        self.source_size = (context.width, context.height)
+        self.frame_size = _target_size(self.source_size, scale, max_side)
+        self.fps = float(self.stream.average_rate or 0)
+        self.frame_count = self.stream.frames
+        self._frames = self._decode()
+
+    def _decode(self):
+        # Decoding packet by packet, so a packet the decoder rejects (a real dropped frame, unlike a frame count
+        # that is only a container estimate) is counted and skipped instead of ending the stream
+        for packet in self.container.demux(self.stream):
+            try:
+                frames = packet.decode()
+            except av.InvalidDataError:
+                metrics.count("frames_dropped")
+                continue
+            yield from frames
+
+    def isOpened(self):
+        return self.container is not None
+
+    def get(self, prop):
+        if prop == cv.CAP_PROP_FRAME_WIDTH:
+            return self.frame_size[0]
+        if prop == cv.CAP_PROP_FRAME_HEIGHT:
+            return self.frame_size[1]
+        if prop == cv.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        return 0
+
+    @timed("read")
+    def read(self):
+        if self.container is None:
+            return False, None
+        start = time.perf_counter()
+        frame = next(self._frames, None)
+        if frame is None:
+            return False, None
+        w, h = self.frame_size
+        frame = frame.reformat(width=w, height=h, format="bgr24")
+        if not self.reuse_buffer:
+            frame = frame.to_ndarray()
+            self.allocations += 1
+        else:
+            if self._buffer is None:
+                self._buffer = np.empty((h, w, 3), dtype=np.uint8)
+                self.allocations += 1
+            # Copying straight from the scaler's plane (whose rows may be padded) instead of through a new array
+            plane = frame.planes[0]
+            rows = np.frombuffer(plane, dtype=np.uint8).reshape(h, plane.line_size)
+            np.copyto(self._buffer, rows[:, :3 * w].reshape(h, w, 3))
+            frame = self._buffer
+        self.decode_time += time.perf_counter() - start
+        self.frames_decoded += 1
+        return True, frame
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+def open_video_source(video_path, backend="auto", scale=1.0, max_side=None, threads=0, reuse_buffer=False):
+    """
+    Opens the frame source used by the scripts in place of cv.VideoCapture.
+
+    Args:
+        video_path: Path of the video file, or a camera index such as 0.
+        backend: 'pyav', 'opencv', or 'auto' to use PyAV for files when it is installed.
+        scale: Downscale factor applied while decoding, e.g. 0.5 for half resolution.
+        max_side: Optional cap on the longest side of the decoded frames, e.g. 640 for inference.
+        threads: Number of decoder threads for the PyAV backend, 0 for one per core.
+        reuse_buffer: Decode (or, with PyAV, convert) into preallocated buffers, with either backend; each
+                      frame is then only valid until the next read().
+
+    Returns:
+        A source with read(), get(), isOpened() and release() methods. Its decode_time and frames_decoded
+        attributes report the time spent in decoding separately from the rest of the loop, and allocations
+        counts the frame arrays allocated.
+    """
+    if backend not in ("auto", "pyav", "opencv"):
+        raise ValueError(f"Unknown video source backend: {backend}")
+
+    is_file = isinstance(video_path, str)
+    if backend == "pyav" and (av is None or not is_file):
+        raise RuntimeError("The PyAV backend needs the 'av' package and a video file path")
+    if backend != "opencv" and av is not None and is_file:
+        source = PyAVSource(video_path, scale=scale, max_side=max_side, threads=threads, reuse_buffer=reuse_buffer)
+        if source.isOpened() or backend == "pyav":
+            return source
+        # Leaving paths PyAV can't open (e.g. a stream URL or a device only OpenCV knows) to cv.VideoCapture, which
+        # reports isOpened() == False itself if it can't open them either
+    return OpenCVSource(video_path, scale=scale, max_side=max_side, reuse_buffer=reuse_buffer)